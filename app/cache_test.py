@@ -0,0 +1,57 @@
+from .cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_get_set():
+    # test should return the cached value and count hits and misses
+    cache = TTLCache(maxsize=10, ttl=10)
+    assert cache.get('banana') is None
+    cache.set('banana', 1)
+    assert cache.get('banana') == 1
+    assert cache.stats() == {'size': 1, 'maxsize': 10, 'hits': 1, 'misses': 1}
+
+
+def test_cache_expires():
+    # test should not return expired values and respect the entry ttl
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=10, timer=timer)
+    cache.set('banana', 1)
+    cache.set('pizza', 2, ttl=1)
+    cache.set('burger', 3, ttl=-1)
+    timer.now = 5
+    assert cache.get('banana') == 1
+    assert cache.get('pizza') is None
+    assert cache.get('burger') is None
+    timer.now = 11
+    assert cache.get('banana') is None
+    assert len(cache) == 0
+
+
+def test_cache_evicts_lru():
+    # test should evict the least recently used entry
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('banana', 1)
+    cache.set('pizza', 2)
+    cache.get('banana')
+    cache.set('burger', 3)
+    assert cache.get('pizza') is None
+    assert cache.get('banana') == 1
+    assert cache.get('burger') == 3
+
+
+def test_cache_delete_clear():
+    # test should remove the entries
+    cache = TTLCache(maxsize=10, ttl=10)
+    cache.set('banana', 1)
+    cache.set('pizza', 2)
+    cache.delete('banana')
+    assert cache.get('banana') is None
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,83 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from .compression import CompressionMiddleware, choose_encoding, parse_accept_encoding
+
+
+def create_client(**options) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100, **options)
+
+    @app.get("/large")
+    def large():
+        return {"items": ["banana"] * 100}
+
+    @app.get("/small")
+    def small():
+        return {"items": []}
+
+    @app.get("/image")
+    def image():
+        return Response(b"\x89PNG" * 100, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b'{"line": 1}\n', b'{"line": 2}\n']), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+def test_parse_accept_encoding():
+    # test should read the quality of each encoding
+    assert parse_accept_encoding("gzip, br;q=0.5, *;q=0") == {"gzip": 1.0, "br": 0.5, "*": 0.0}
+    assert parse_accept_encoding("") == {}
+
+
+def test_choose_encoding():
+    # test should prefer the highest quality and then the server order
+    assert choose_encoding("gzip, br", ("br", "gzip")) == "br"
+    assert choose_encoding("gzip, br;q=0.5", ("br", "gzip")) == "gzip"
+    assert choose_encoding("*", ("br", "gzip")) == "br"
+    assert choose_encoding("identity", ("br", "gzip")) is None
+    assert choose_encoding("gzip;q=0", ("gzip",)) is None
+
+
+def test_gzip():
+    # test should compress the large responses
+    response = create_client().get("/large", headers={"Accept-Encoding": "gzip"}, stream=True)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    body = response.raw.read(decode_content=False)
+    assert int(response.headers["content-length"]) == len(body)
+    assert json.loads(gzip.decompress(body)) == {"items": ["banana"] * 100}
+
+
+def test_brotli():
+    # test should use brotli when the client accepts it
+    brotli = pytest.importorskip("brotli")
+    response = create_client().get("/large", headers={"Accept-Encoding": "gzip, br"}, stream=True)
+    assert response.headers["content-encoding"] == "br"
+    assert json.loads(brotli.decompress(response.raw.read(decode_content=False))) == {"items": ["banana"] * 100}
+
+
+def test_not_compressed():
+    # test should send the small, not compressible or not accepted responses as they are
+    client = create_client()
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/image", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/large", headers={"Accept-Encoding": "identity"}).headers
+    disabled = create_client(enabled=False)
+    assert "content-encoding" not in disabled.get("/large", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_stream():
+    # test should compress the streamed responses chunk by chunk
+    response = create_client().get("/stream", headers={"Accept-Encoding": "gzip"}, stream=True)
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(response.raw.read(decode_content=False)) == b'{"line": 1}\n{"line": 2}\n'
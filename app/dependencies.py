@@ -1,35 +1,81 @@
-from fastapi import HTTPException, status, Request
-from jose import jwt, JWTError
+import time
 
-from .env import COOKIE_ACCESS_KEY, SECRET_KEY, ALGORITHM
+from fastapi import Depends, HTTPException, status, Request
+
+from .cache import TTLCache
+from .env import COOKIE_ACCESS_KEY, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS
+from .keys import InvalidToken, key_set
+from .logs import bind_log_context
+from .metrics import timed
 from .models import token as token_models
+from .models.users import is_admin
+from .repositories.motor import users as user_repo
+from .services.revocation import revocation_list
 
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="user not authenticated",
 )
 
+# token_cache keeps the verified tokens and their ids, so the same cookie is not decoded on every request
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_key = key_set.version
+
+
+# check_token_cache_key clears the cached tokens when the keys change
+def check_token_cache_key(key):
+    global _token_cache_key
+    if key != _token_cache_key:
+        token_cache.clear()
+        _token_cache_key = key
+
+
+# decode_token verifies the token and returns its claims, the key is found by the kid of the header
+def decode_token(token: str) -> dict:
+    try:
+        with timed("jwt_decode"):
+            return key_set.decode(token)
+    except InvalidToken:
+        raise credentials_exception
+
 
 def get_token_data(token: str):
     # check if the token is found
     if not token:
         raise credentials_exception
 
-    # check if token is valid
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
-        _id = payload.get('id')
-
-        if _id is None:
+    # check if the token has been verified before
+    key_set.maybe_reload()
+    check_token_cache_key(key_set.version)
+    cached = token_cache.get(token)
+    if cached is not None:
+        token_data, jti = cached
+        # the revocation is checked on every request, the revoked tokens stay on the cache
+        if revocation_list.is_revoked(jti):
             raise credentials_exception
+        return token_data
 
-        token_data = token_models.TokenData(id=_id)
+    # check if token is valid
+    payload = decode_token(token)
+    _id = payload.get('id')
 
-        return token_data
+    # the refresh tokens can not be used as access tokens
+    if _id is None or payload.get('type', 'access') != 'access':
+        raise credentials_exception
+
+    token_data = token_models.TokenData(id=_id)
 
-    except JWTError:
+    jti = payload.get('jti')
+    if revocation_list.is_revoked(jti):
         raise credentials_exception
 
+    # the entry must expire with the token
+    exp = payload.get('exp')
+    if exp is not None:
+        token_cache.set(token, (token_data, jti), ttl=exp - time.time())
+
+    return token_data
+
 
 # get_token_cookie should return the token received on headers cookies
 async def get_token_cookie(request: Request):
@@ -38,7 +84,17 @@ async def get_token_cookie(request: Request):
     if not cookies:
         raise credentials_exception
 
-    token = cookies[COOKIE_ACCESS_KEY]
+    token = cookies.get(COOKIE_ACCESS_KEY)
     token_data = get_token_data(token)
+    # the logs of the request have the user id
+    bind_log_context(user_id=token_data.id)
+
+    return token_data
+
 
+# require_admin checks that the authenticated user has the admin role, the roles are kept on the user document
+async def require_admin(token_data: token_models.TokenData = Depends(get_token_cookie),
+                        coll=Depends(user_repo.get_user_collection)):
+    if not is_admin(await user_repo.find_one_document(coll, token_data.id)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="the admin role is required")
     return token_data
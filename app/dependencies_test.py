@@ -2,12 +2,15 @@ from datetime import timedelta
 
 import pytest
 from fastapi import HTTPException, status
+from jose import jwt
 
-from .dependencies import get_token_data
+from .dependencies import get_token_data, token_cache, check_token_cache_key
 from .env import ACCESS_TOKEN_EXPIRE_MINUTES
+from .keys import key_set
 from .mocks.mock_users import get_mock_user
 from .models.token import TokenData
 from .routers.users import create_access_token
+from .services.revocation import revocation_list
 
 new_user_db = get_mock_user()
 
@@ -40,3 +43,36 @@ def test_no_expired_token():
     with pytest.raises(HTTPException) as e:
         get_token_data(access_token)
     assert e.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_get_token_data_cached():
+    # test should decode the token only once
+    access_token = create_mock_token(_id='507f1f77bcf86cd799439012')
+    misses = token_cache.misses
+    hits = token_cache.hits
+    first = get_token_data(access_token)
+    second = get_token_data(access_token)
+    assert first == second
+    assert token_cache.misses == misses + 1
+    assert token_cache.hits == hits + 1
+
+
+def test_token_cache_key_changed():
+    # test should clear the cached tokens when the key changes
+    access_token = create_mock_token(_id='507f1f77bcf86cd799439013')
+    get_token_data(access_token)
+    assert token_cache.get(access_token) is not None
+    check_token_cache_key('banana')
+    assert token_cache.get(access_token) is None
+    check_token_cache_key(key_set.version)
+
+
+def test_revoked_token():
+    # test should reject the revoked token even if it is cached
+    access_token = create_mock_token(_id='507f1f77bcf86cd799439014')
+    get_token_data(access_token)
+    claims = jwt.get_unverified_claims(access_token)
+    revocation_list.add(claims['jti'], claims['exp'])
+    with pytest.raises(HTTPException) as e:
+        get_token_data(access_token)
+    assert e.value.status_code == status.HTTP_401_UNAUTHORIZED
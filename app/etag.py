@@ -0,0 +1,47 @@
+import hashlib
+from typing import Optional
+
+import bson
+
+
+# document_etag returns a weak ETag of the mongo document, from its version when it has one or else from a
+# hash of its BSON, so the ETag is computed without serializing the response. it is weak because the
+# compressed and the plain responses share it
+def document_etag(document: dict) -> str:
+    version = document.get("version")
+    if version is not None:
+        return f'W/"{document["_id"]}-{version}"'
+    return f'W/"{hashlib.blake2b(bson.encode(document), digest_size=16).hexdigest()}"'
+
+
+# etag_version returns the version of the ETag of the document with the id, None if it is not a version ETag.
+# the weak ETags are accepted on If-Match on purpose, against RFC 7232 that asks for the strong comparison: the
+# ETags are weak only because the compressed and the plain responses share them, and the version names the stored
+# document exactly, which is what If-Match protects
+def etag_version(etag: Optional[str], _id) -> Optional[int]:
+    if not etag:
+        return None
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    prefix = f'"{_id}-'
+    if not etag.startswith(prefix) or not etag.endswith('"') or not etag[len(prefix):-1].isdigit():
+        return None
+    return int(etag[len(prefix):-1])
+
+
+# etag_matches checks if the If-None-Match header has the ETag, the weak comparison is used. it is used for
+# If-Match too, see etag_version
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
@@ -0,0 +1,39 @@
+from bson import ObjectId
+
+from .etag import document_etag, etag_matches, etag_version
+
+
+def test_document_etag():
+    # test should change the ETag when the document changes
+    document = {"_id": ObjectId("507f1f77bcf86cd799439011"), "name": "banana"}
+    etag = document_etag(document)
+    assert etag.startswith('W/"')
+    assert etag == document_etag(dict(document))
+    assert etag != document_etag({**document, "name": "pizza"})
+
+
+def test_document_etag_version():
+    # test should use the version of the document
+    document = {"_id": ObjectId("507f1f77bcf86cd799439011"), "name": "banana", "version": 3}
+    assert document_etag(document) == 'W/"507f1f77bcf86cd799439011-3"'
+
+
+def test_etag_matches():
+    # test should compare the ETags with the weak comparison
+    assert etag_matches('W/"a"', 'W/"a"')
+    assert etag_matches('"a"', 'W/"a"')
+    assert etag_matches('"b", W/"a"', 'W/"a"')
+    assert etag_matches('*', 'W/"a"')
+    assert not etag_matches('W/"b"', 'W/"a"')
+    assert not etag_matches(None, 'W/"a"')
+
+
+def test_etag_version():
+    # test should read the version of the ETags of the document only
+    _id = ObjectId("507f1f77bcf86cd799439011")
+    assert etag_version(document_etag({"_id": _id, "version": 3}), _id) == 3
+    assert etag_version('"507f1f77bcf86cd799439011-3"', str(_id)) == 3
+    assert etag_version('W/"507f1f77bcf86cd799439012-3"', _id) is None
+    assert etag_version(document_etag({"_id": _id}), _id) is None
+    assert etag_version('*', _id) is None
+    assert etag_version(None, _id) is None
@@ -0,0 +1,106 @@
+"""Import time of the app.
+
+It imports the module on a new interpreter with "python -X importtime", so no module is already imported, and
+reports the total time, the time of each module and of each top level package:
+
+    python -m app.importtime --top 20
+    python -m app.importtime --runs 5 --json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+# LAZY_MODULES are loaded on first use, importing the app must not import them
+LAZY_MODULES = ("pymongo", "motor", "passlib", "jose", "cryptography")
+
+
+class ModuleTime(NamedTuple):
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+# parse_importtime parses the -X importtime lines written on stderr
+def parse_importtime(output: str) -> List[ModuleTime]:
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append(ModuleTime(name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+# by_package sums the self time of the modules of each top level package
+def by_package(modules: List[ModuleTime]) -> Dict[str, int]:
+    packages: Dict[str, int] = {}
+    for module in modules:
+        package = module.name.split(".")[0]
+        packages[package] = packages.get(package, 0) + module.self_us
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+# measure imports the module on a new interpreter and returns the wall time and the modules imported,
+# the time of each module is only recorded with importtime, which makes the import a bit slower
+def measure(module: str = "app.main", importtime: bool = True) -> dict:
+    code = ("import sys, time; start = time.perf_counter(); import {module}; "
+            "print(time.perf_counter() - start); print(','.join(sorted(sys.modules)))").format(module=module)
+    options = ["-X", "importtime"] if importtime else []
+    result = subprocess.run([sys.executable, *options, "-c", code], capture_output=True, text=True, check=True)
+    seconds, loaded = result.stdout.strip().splitlines()[-2:]
+    return {
+        "seconds": float(seconds),
+        "modules": parse_importtime(result.stderr),
+        "loaded": loaded.split(","),
+    }
+
+
+# report returns the median of the runs with the slowest modules and packages of the last run
+def report(module: str = "app.main", runs: int = 3, top: int = 15) -> dict:
+    results = [measure(module) for _ in range(runs)]
+    modules = results[-1]["modules"]
+    loaded = set(results[-1]["loaded"])
+    return {
+        "module": module,
+        "runs": runs,
+        "median_seconds": statistics.median(result["seconds"] for result in results),
+        "packages_ms": {name: round(us / 1000, 2) for name, us in list(by_package(modules).items())[:top]},
+        "modules_ms": {m.name: round(m.cumulative_us / 1000, 2)
+                       for m in sorted(modules, key=lambda m: m.cumulative_us, reverse=True)[:top]},
+        "app_modules_ms": {m.name: round(m.self_us / 1000, 2)
+                           for m in sorted(modules, key=lambda m: m.self_us, reverse=True)
+                           if m.name.startswith("app.")},
+        "eager_lazy_modules": sorted(name for name in LAZY_MODULES if name in loaded),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="reports the import time of the app")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="prints the report as json")
+    args = parser.parse_args(argv)
+
+    result = report(args.module, args.runs, args.top)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"{result['module']}: {result['median_seconds'] * 1000:.1f} ms (median of {result['runs']} runs)")
+    for title, key in (("packages (self)", "packages_ms"), ("modules (cumulative)", "modules_ms"),
+                       ("app modules (self)", "app_modules_ms")):
+        print(f"\n{title}")
+        for name, ms in result[key].items():
+            print(f"  {ms:9.2f} ms  {name}")
+    if result["eager_lazy_modules"]:
+        print(f"\nimported eagerly: {', '.join(result['eager_lazy_modules'])}")
+
+
+if __name__ == "__main__":
+    main()
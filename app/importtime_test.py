@@ -0,0 +1,27 @@
+import statistics
+
+from .env import IMPORT_TIME_BUDGET_SECONDS
+from .importtime import LAZY_MODULES, measure, parse_importtime, by_package
+
+
+def test_parse_importtime():
+    # test should read the self and cumulative times of each module
+    output = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       100 |        100 |   app.env\n"
+              "import time:        50 |        150 | app\n")
+    modules = parse_importtime(output)
+    assert [(m.name, m.self_us, m.cumulative_us, m.depth) for m in modules] == [
+        ("app.env", 100, 100, 1), ("app", 50, 150, 0)]
+    assert by_package(modules) == {"app": 150}
+
+
+def test_lazy_modules_not_imported():
+    # test should not load the mongo driver, the password hashing or the JWT libraries on import
+    loaded = set(measure("app.main", importtime=False)["loaded"])
+    assert not loaded.intersection(LAZY_MODULES)
+
+
+def test_cold_import_budget():
+    # test should import the app under the budget, IMPORT_TIME_BUDGET_SECONDS can be raised for slow machines
+    seconds = statistics.median(measure("app.main", importtime=False)["seconds"] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET_SECONDS
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import status
+from fastapi.testclient import TestClient
+from mongomock import MongoClient
+
+from app.main import app
+from ..env import COOKIE_ACCESS_KEY
+from ..mocks.mock_users import get_mock_user
+from ..models.token import TokenData
+from ..models.users import ADMIN_ROLE, UserInDB
+from ..repositories.cache.users import profile_cache, profile_key
+from ..repositories.mongo import users as user_repo
+from ..routers.users import create_access_token
+
+mock_coll = MongoClient().db.collection
+
+ADMIN_ID = '507f1f77bcf86cd7994390aa'
+
+
+# set_admin_role sets the roles of the user of the admin client
+def set_admin_role(roles):
+    mock_coll.update_one({'_id': ObjectId(ADMIN_ID)}, {'$set': {'email': 'root@aaaa.com', 'name': 'root',
+                                                              'hashed_password': 'banana', 'roles': roles}},
+                         upsert=True)
+    # the role is read through the profile cache
+    asyncio.run(profile_cache.invalidate(profile_key(mock_coll, ADMIN_ID)))
+
+
+# admin_client returns a client that uses the mock collection and is authenticated as an admin
+@pytest.fixture
+def admin_client():
+    previous = app.dependency_overrides.get(user_repo.get_user_collection)
+    app.dependency_overrides[user_repo.get_user_collection] = lambda: mock_coll
+    token = create_access_token(TokenData(id=ADMIN_ID).dict(), timedelta(minutes=1))
+    client = TestClient(app)
+    client.cookies.set(COOKIE_ACCESS_KEY, token)
+    set_admin_role([ADMIN_ROLE])
+    yield client
+    app.dependency_overrides[user_repo.get_user_collection] = previous
+    # the cache keys are shared by the mock collections of the other tests
+    asyncio.run(profile_cache.invalidate(profile_key(mock_coll, ADMIN_ID)))
+
+
+def create_mock_users(count):
+    mock_user = get_mock_user()
+    for n in range(count):
+        user = UserInDB(email=f'admin{n}@aaaa.com', hashed_password='banana', name=mock_user.name)
+        mock_coll.insert_one(user.mongo())
+
+
+def test_list_users(admin_client):
+    # test should page the users with the cursor
+    create_mock_users(3)
+    response = admin_client.get("/admin/users/", params={'limit': 2, 'email_prefix': 'admin'})
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    assert [user['email'] for user in page['items']] == ['admin0@aaaa.com', 'admin1@aaaa.com']
+    assert 'hashed_password' not in page['items'][0]
+    # the pages filtered by email prefix are in email order
+    assert page['next_cursor'] == 'admin1@aaaa.com'
+
+    response = admin_client.get("/admin/users/", params={'limit': 2, 'email_prefix': 'admin',
+                                                         'after': page['next_cursor']})
+    page = response.json()
+    assert [user['email'] for user in page['items']] == ['admin2@aaaa.com']
+    assert page['next_cursor'] is None
+
+
+def test_list_users_invalid_cursor(admin_client):
+    # test should raise error when the cursor is invalid
+    response = admin_client.get("/admin/users/", params={'after': 'banana'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_list_users_not_admin(admin_client):
+    # test should forbid the users without the admin role
+    set_admin_role([])
+    response = admin_client.get("/admin/users/")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_list_users_unauthenticated():
+    # test should throw error for non authenticated user
+    response = TestClient(app).get("/admin/users/")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_profile(admin_client):
+    # test should return the sampled stacks to the admins only
+    set_admin_role([])
+    response = admin_client.get("/admin/profile", params={'seconds': 0.05})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    set_admin_role([ADMIN_ROLE])
+    response = admin_client.get("/admin/profile", params={'seconds': 0.05, 'interval_ms': 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert int(response.headers['x-profile-samples']) > 0
+    stack, count = response.text.splitlines()[0].rsplit(' ', 1)
+    assert ';' in stack and int(count) > 0
+
+    response = admin_client.get("/admin/profile", params={'seconds': 0.05, 'format': 'speedscope'})
+    assert response.json()['profiles'][0]['type'] == 'sampled'
+    assert admin_client.get("/admin/profile", params={'seconds': 0}).status_code == \
+        status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_profile_request(admin_client, caplog):
+    # test should log the profile of the requests of the admins sent with the X-Profile header
+    set_admin_role([ADMIN_ROLE])
+    with caplog.at_level(logging.WARNING, logger="app.profiler"):
+        response = admin_client.get("/admin/users/", headers={'X-Profile': '1'})
+        assert response.status_code == status.HTTP_200_OK
+        TestClient(app).get("/", headers={'X-Profile': '1'})
+    profiles = [record for record in caplog.records if record.getMessage() == "request profile"]
+    assert [record.path for record in profiles] == ["/admin/users/"]
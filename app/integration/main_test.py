@@ -1,6 +1,8 @@
+from bson import ObjectId
 from fastapi.testclient import TestClient
 
 from app.main import app
+from ..routers import health
 
 client = TestClient(app)
 
@@ -11,3 +13,67 @@ def test_read_main():
     assert response.status_code == 200
     assert response.json() == {"message": "Welcome to Gui's TODO app written with FastAPI"}
 
+
+def test_server_timing():
+    # test should send the Server-Timing header
+    response = client.get("/")
+    assert 'total;dur=' in response.headers['server-timing']
+
+
+def test_metrics():
+    # test should return the metrics in the prometheus format
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",path="/",status="200"}' in response.text
+    assert 'password_hasher_pending' in response.text
+
+
+def test_metrics_path_label():
+    # test should label the requests with the route template, the paths of no route share one label
+    for _ in range(3):
+        client.get(f"/todos/{ObjectId()}")
+        client.get(f"/{ObjectId()}")
+    text = client.get("/metrics").text
+    assert text.count('_count{method="GET",path="/todos/{todo_id}",status="401"}') == 1
+    assert 'method="GET",path="unmatched",status="404"' in text
+    assert '/todos/6' not in text
+
+
+def test_healthz():
+    # test should answer while the process is running
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readyz(monkeypatch):
+    # test should be ready when mongo answers and the queues are empty
+    async def ping():
+        pass
+
+    monkeypatch.setattr(health, "mongo_ping", health.CachedPing(ping))
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.headers['cache-control'] == 'no-store'
+    assert set(response.json()['checks']) >= {'mongo', 'password_hasher', 'event_loop'}
+
+
+def test_readyz_unavailable(monkeypatch):
+    # test should answer 503 when mongo is down or the hasher queue is backed up
+    async def broken():
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(health, "mongo_ping", health.CachedPing(broken))
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert not response.json()['checks']['mongo']['ok']
+
+    async def ping():
+        pass
+
+    monkeypatch.setattr(health, "mongo_ping", health.CachedPing(ping))
+    monkeypatch.setattr(health.password_hasher, "pending", health.password_hasher.max_pending)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert not response.json()['checks']['password_hasher']['ok']
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import status
+from fastapi.testclient import TestClient
+from mongomock import MongoClient
+
+from app.main import app
+from ..env import COOKIE_ACCESS_KEY, TODO_LIST_MAX_LIMIT
+from ..models.token import TokenData
+from ..repositories.mongo import todos as todo_repo
+from ..repositories.mongo.connection import create_indexes
+from ..routers.users import create_access_token
+
+mock_coll = MongoClient().db.todos
+create_indexes(mock_coll, "todos")
+
+
+# todo_client returns a client of a new user that uses the mock collection
+@pytest.fixture
+def todo_client():
+    previous = app.dependency_overrides.get(todo_repo.get_todo_collection)
+    app.dependency_overrides[todo_repo.get_todo_collection] = lambda: mock_coll
+    token = create_access_token(TokenData(id=str(ObjectId())).dict(), timedelta(minutes=1))
+    client = TestClient(app)
+    client.cookies.set(COOKIE_ACCESS_KEY, token)
+    yield client
+    if previous is None:
+        del app.dependency_overrides[todo_repo.get_todo_collection]
+    else:
+        app.dependency_overrides[todo_repo.get_todo_collection] = previous
+
+
+def test_create_and_get_todo(todo_client):
+    # test should create the Todo and find it by id
+    response = todo_client.post("/todos/", json={"title": "buy milk", "due_date": "2021-05-01T10:00:00"})
+    assert response.status_code == status.HTTP_200_OK
+    todo = response.json()
+    assert todo["title"] == "buy milk"
+    assert todo["completed"] is False
+    assert todo["due_date"] == "2021-05-01T10:00:00"
+
+    response = todo_client.get(f"/todos/{todo['id']}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == todo
+
+    response = todo_client.get(f"/todos/{ObjectId()}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = todo_client.post("/todos/", json={"title": ""})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_list_todos(todo_client):
+    # test should page the Todos of the user with the cursor
+    ids = [todo_client.post("/todos/", json={"title": str(n)}).json()["id"] for n in range(5)]
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 2, **({"after": after} if after else {})}
+        response = todo_client.get("/todos/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        seen += [todo["id"] for todo in page["items"]]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert seen == ids[::-1]
+
+    assert todo_client.get("/todos/", params={"after": "banana"}).status_code == status.HTTP_400_BAD_REQUEST
+    response = todo_client.get("/todos/", params={"limit": TODO_LIST_MAX_LIMIT + 1})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_batch_todos(todo_client):
+    # test should complete and delete the Todos with one request
+    ids = [todo_client.post("/todos/", json={"title": str(n)}).json()["id"] for n in range(3)]
+    response = todo_client.post("/todos/batch", json={"complete": ids[:2], "delete": [ids[2]]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"modified": 2, "deleted": 1}
+
+    page = todo_client.get("/todos/", params={"completed": True}).json()
+    assert sorted(todo["id"] for todo in page["items"]) == sorted(ids[:2])
+    assert todo_client.get(f"/todos/{ids[2]}").status_code == status.HTTP_404_NOT_FOUND
+
+    response = todo_client.post("/todos/batch", json={"reopen": ids[:1]})
+    assert response.json() == {"modified": 1, "deleted": 0}
+
+
+def test_todos_unauthenticated():
+    # test should reject the requests without the access cookie
+    response = TestClient(app).get("/todos/")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -1,16 +1,26 @@
+import asyncio
+import json
+
 from fastapi import status
 from fastapi.testclient import TestClient
 from mongomock import MongoClient
 
 from app.main import app
-from ..env import COOKIE_ACCESS_KEY
+from ..env import COOKIE_ACCESS_KEY, COOKIE_REFRESH_KEY, SIGN_IN_EMAIL_BURST
 from ..mocks.mock_users import get_mock_user, get_mock_user_sign_in
-from ..models.users import User, UserSignIn
+from ..models.users import ADMIN_ROLE, User, UserSignIn
+from ..repositories.cache.users import profile_cache, profile_key
 from ..repositories.mongo import users as user_repo
+from ..repositories.mongo.connection import create_indexes
+from ..repositories.mongo.revocations import get_revoked_token_collection
+from ..services.password import build_crypt_context, check_password
 
 client = TestClient(app)
 
 mock_coll = MongoClient().db.collection
+create_indexes(mock_coll)
+mock_revoked_coll = MongoClient().db.revoked_tokens
+create_indexes(mock_revoked_coll, "revoked_tokens")
 
 new_user_db = get_mock_user()
 new_user_sign_in = get_mock_user_sign_in()
@@ -28,6 +38,7 @@ def get_mocked_user_collection():
 
 # overrides the deps so it uses a mock collection instead of calling the actually database
 app.dependency_overrides[user_repo.get_user_collection] = get_mocked_user_collection
+app.dependency_overrides[get_revoked_token_collection] = lambda: mock_revoked_coll
 
 
 def test_create_user():
@@ -54,6 +65,58 @@ def test_get_me():
     assert response.json() == new_user
 
 
+def test_get_me_not_modified():
+    # test should return 304 without body when the user did not change
+    response = client.get("/users/me/")
+    etag = response.headers['etag']
+    response = client.get("/users/me/", headers={'If-None-Match': etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers['etag'] == etag
+    assert response.content == b''
+
+    response = client.get("/users/me/", headers={'If-None-Match': 'W/"other"'})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_update_me():
+    # test should update the sent fields and return the new ETag
+    etag = client.get("/users/me/").headers['etag']
+    response = client.patch("/users/me/", json={'display_name': 'banana', 'photo_url': None},
+                            headers={'If-Match': etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['display_name'] == 'banana'
+    assert response.json()['photo_url'] is None
+    assert response.json()['name'] == new_user_db.name
+    assert response.headers['etag'] != etag
+
+    # the profile is not served from the cache after the update
+    response = client.get("/users/me/")
+    assert response.json()['display_name'] == 'banana'
+    assert 'photo_url' not in mock_coll.find_one({'email': new_user_db.email})
+
+
+def test_update_me_conflict():
+    # test should reject the update of a user that changed since it was read
+    etag = client.get("/users/me/").headers['etag']
+    response = client.patch("/users/me/", json={'display_name': 'pizza'}, headers={'If-Match': etag})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.patch("/users/me/", json={'display_name': 'banana'}, headers={'If-Match': etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert client.get("/users/me/").json()['display_name'] == 'pizza'
+
+    # without If-Match the last update wins
+    response = client.patch("/users/me/", json={'display_name': 'banana'})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_update_me_invalid():
+    # test should reject empty updates and the removal of the name
+    assert client.patch("/users/me/", json={}).status_code == status.HTTP_400_BAD_REQUEST
+    response = client.patch("/users/me/", json={'name': None})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 def test_get_me_unauthenticated():
     # test should throw error for non authenticated user
     response = client.get("/users/me/", cookies={'todo.access-token': ''})
@@ -64,6 +127,7 @@ def test_sign_in():
     # test should sign in user without errors
     response = client.post("/users/sign-in/", json=new_user_sign_in.dict())
     assert response.status_code == status.HTTP_200_OK
+    assert 'hash_verify;dur=' in response.headers['server-timing']
 
     stored_user = mock_coll.find_one({'email': new_user_sign_in.email})
     new_user = User.from_mongo(stored_user).dict()
@@ -71,6 +135,7 @@ def test_sign_in():
     assert response.json() == new_user
 
     assert response.cookies[COOKIE_ACCESS_KEY]
+    assert response.cookies[COOKIE_REFRESH_KEY]
 
 
 def test_sign_in_wrong():
@@ -82,3 +147,105 @@ def test_sign_in_wrong():
 
     response = client.post("/users/sign-in/", json=wrong_sign_in_info.dict())
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+# set_roles sets the roles of the user of the client, the roles are read through the profile cache
+def set_roles(roles):
+    stored_user = mock_coll.find_one_and_update({'email': new_user_db.email}, {'$set': {'roles': roles}})
+    asyncio.run(profile_cache.invalidate(profile_key(mock_coll, stored_user['_id'])))
+
+
+def test_create_users_bulk_not_admin():
+    # test should forbid the bulk import to the users without the admin role
+    response = client.post("/users/bulk", data=new_user_db.json())
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert mock_coll.find_one({'email': 'bulk1@aaaa.com'}) is None
+
+
+def test_create_users_bulk():
+    # test should create the valid users and return one result per line
+    set_roles([ADMIN_ROLE])
+    users = [
+        new_user_db.copy(update={'email': 'bulk1@aaaa.com', 'phone_number': '01000000001'}),
+        new_user_db.copy(update={'email': 'bulk2@aaaa.com', 'phone_number': '01000000002'}),
+        new_user_db.copy(update={'email': 'bulk2@aaaa.com', 'phone_number': '01000000002'}),
+        new_user_db.copy(update={'email': 'bulk3@aaaa.com', 'password_confirm': 'pizza'}),
+    ]
+    body = '\n'.join(user.json() for user in users) + '\n{"email": "banana"}\n'
+    response = client.post("/users/bulk", data=body)
+    assert response.status_code == status.HTTP_200_OK
+
+    results = {result['line']: result for result in map(json.loads, response.text.splitlines())}
+    assert set(results) == {1, 2, 3, 4, 5}
+    assert results[1]['id'] == str(mock_coll.find_one({'email': 'bulk1@aaaa.com'})['_id'])
+    assert results[2]['id'] == str(mock_coll.find_one({'email': 'bulk2@aaaa.com'})['_id'])
+    assert results[3]['error']['code'] == 11000
+    assert results[4]['error'] == 'passwords not match'
+    assert results[5]['error']
+    set_roles([])
+
+
+def test_create_users_bulk_unauthenticated():
+    # test should throw error for non authenticated user
+    response = client.post("/users/bulk", data='', cookies={COOKIE_ACCESS_KEY: ''})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_sign_in_rehash():
+    # test should re-hash the password created with an old cost after sign in
+    old_hash = build_crypt_context(bcrypt_rounds=4).hash('banana')
+    mock_coll.insert_one({'email': 'rehash@aaaa.com', 'name': 'test', 'hashed_password': old_hash})
+    response = client.post("/users/sign-in/", json={'email': 'rehash@aaaa.com', 'password': 'banana'})
+    assert response.status_code == status.HTTP_200_OK
+
+    new_hash = mock_coll.find_one({'email': 'rehash@aaaa.com'})['hashed_password']
+    assert new_hash != old_hash
+    assert check_password('banana', new_hash)
+
+
+def test_sign_in_rate_limit():
+    # test should reject the sign in after too many attempts for the same email
+    sign_in_info = {'email': 'limited@aaaa.com', 'password': 'pizza'}
+    statuses = [client.post("/users/sign-in/", json=sign_in_info).status_code for _ in range(SIGN_IN_EMAIL_BURST + 1)]
+    assert statuses == [status.HTTP_401_UNAUTHORIZED] * SIGN_IN_EMAIL_BURST + [status.HTTP_429_TOO_MANY_REQUESTS]
+
+    # test should not charge the successful sign in
+    for _ in range(SIGN_IN_EMAIL_BURST + 1):
+        assert client.post("/users/sign-in/", json=new_user_sign_in.dict()).status_code == status.HTTP_200_OK
+
+
+def test_refresh():
+    # test should renew both tokens and accept the refresh token only once
+    refresh_client = TestClient(app)
+    response = refresh_client.post("/users/sign-in/", json=new_user_sign_in.dict())
+    assert response.status_code == status.HTTP_200_OK
+    refresh_token = response.cookies[COOKIE_REFRESH_KEY]
+
+    # the refresh token is not an access token
+    response = TestClient(app).get("/users/me/", cookies={COOKIE_ACCESS_KEY: refresh_token})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = refresh_client.post("/users/refresh/")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert response.cookies[COOKIE_ACCESS_KEY]
+    assert response.cookies[COOKIE_REFRESH_KEY] != refresh_token
+    assert refresh_client.get("/users/me/").status_code == status.HTTP_200_OK
+
+    response = TestClient(app).post("/users/refresh/", cookies={COOKIE_REFRESH_KEY: refresh_token})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_sign_out():
+    # test should revoke the tokens, so copies of the cookies are rejected
+    sign_out_client = TestClient(app)
+    response = sign_out_client.post("/users/sign-in/", json=new_user_sign_in.dict())
+    cookies = {COOKIE_ACCESS_KEY: response.cookies[COOKIE_ACCESS_KEY],
+               COOKIE_REFRESH_KEY: response.cookies[COOKIE_REFRESH_KEY]}
+    assert sign_out_client.get("/users/me/").status_code == status.HTTP_200_OK
+
+    response = sign_out_client.post("/users/sign-out/")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert mock_revoked_coll.count_documents({}) >= 2
+
+    assert TestClient(app).get("/users/me/", cookies=cookies).status_code == status.HTTP_401_UNAUTHORIZED
+    assert TestClient(app).post("/users/refresh/", cookies=cookies).status_code == status.HTTP_401_UNAUTHORIZED
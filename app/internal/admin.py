@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from ..dependencies import require_admin
+from ..env import ADMIN_LIST_MAX_LIMIT, PROFILE_MAX_SECONDS, PROFILE_INTERVAL_MS
+from ..profiler import SamplingProfiler, profile_slot
+from ..repositories.motor import users as user_repo
+
+# create admin router, all the routes needs an authenticated user with the admin role
+router = APIRouter(
+    dependencies=[Depends(require_admin)],
+    responses={status.HTTP_401_UNAUTHORIZED: {"detail": "could not validate credentials"},
+               status.HTTP_403_FORBIDDEN: {"detail": "the admin role is required"}},
+)
+
+
+# stream_users_page streams the page as {"items": [...], "next_cursor": ...}, so the page is never held in memory.
+# the cursor is the cursor_field of the last user
+async def stream_users_page(users: AsyncIterator, limit: int, cursor_field: str = "id") -> AsyncIterator[bytes]:
+    yield b'{"items": ['
+    count = 0
+    last_user = None
+    async for user in users:
+        if count:
+            yield b','
+        yield user.json().encode()
+        count += 1
+        last_user = user
+
+    # the next page exists only if this one is full
+    next_cursor = None
+    if count == limit and last_user is not None:
+        next_cursor = str(getattr(last_user, cursor_field))
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'.encode()
+
+
+@router.get("/users/")
+async def list_users(after: Optional[str] = None, limit: int = Query(100, ge=1, le=ADMIN_LIST_MAX_LIMIT),
+                     email_prefix: Optional[str] = None, name: Optional[str] = None,
+                     coll=Depends(user_repo.get_user_collection)):
+    # the pages filtered by email prefix only are in email order and their cursor is the email, the other
+    # cursors are ids and are checked before the response starts
+    sort = user_repo.page_sort(email_prefix, name)
+    if after is not None and sort == "_id":
+        user_repo.check_valid_id(after)
+
+    users = user_repo.find_many(coll, after=after, limit=limit, email_prefix=email_prefix, name=name)
+    cursor_field = "email" if sort == "email" else "id"
+    return StreamingResponse(stream_users_page(users, limit, cursor_field), media_type="application/json")
+
+
+# profile samples the stacks of all the threads of the worker that serves the request for the given seconds,
+# as collapsed stacks for flamegraph.pl or as a speedscope profile
+@router.get("/profile", responses={status.HTTP_409_CONFLICT: {"detail": "a profile is already running"}})
+async def profile(seconds: float = Query(5, gt=0, le=PROFILE_MAX_SECONDS),
+                  interval_ms: float = Query(PROFILE_INTERVAL_MS, ge=1, le=1000),
+                  format: str = Query("collapsed", regex="^(collapsed|speedscope)$")):
+    if not profile_slot.acquire(blocking=False):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="a profile is already running")
+    profiler = SamplingProfiler(interval=interval_ms / 1000, max_seconds=seconds)
+    try:
+        profiler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+        profile_slot.release()
+
+    # the workers are profiled one by one, the pid tells which one was profiled
+    headers = {"X-Profile-Pid": str(os.getpid()), "X-Profile-Samples": str(profiler.samples)}
+    if format == "speedscope":
+        return JSONResponse(profiler.speedscope(name=f"pid {os.getpid()}"), headers=headers)
+    return PlainTextResponse(profiler.collapsed(), headers=headers)
@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from .env import SECRET_KEY, ALGORITHM, JWT_KEYS_DIR, JWT_ACTIVE_KID, JWT_KEYS_RELOAD_SECONDS
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512")
+DEFAULT_KID = "default"
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from jose.backends.base import Key
+
+
+# InvalidToken is raised when the token can not be verified
+class InvalidToken(Exception):
+    pass
+
+
+# KeySet keeps the parsed signing and verification keys by kid, the pem files are parsed only when they change.
+# the keys are loaded on first use, so importing the app does not load jose and the crypto backend
+class KeySet:
+    def __init__(self, algorithm: str = "HS256", secret: str = "", keys_dir: str = "", active_kid: str = "",
+                 reload_seconds: float = 30, timer=time.monotonic):
+        if algorithm.startswith("HS"):
+            if not secret:
+                raise ValueError(f"{algorithm} needs a secret key")
+        elif algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ValueError(f"algorithm {algorithm} is not supported")
+        elif not keys_dir:
+            raise ValueError(f"{algorithm} needs a keys directory")
+
+        self.algorithm = algorithm
+        self.keys_dir = keys_dir if not algorithm.startswith("HS") else ""
+        self.reload_seconds = reload_seconds
+        self.timer = timer
+        # version changes every time the keys change
+        self.version = 0
+        self._active_kid_env = active_kid
+        self._secret = secret
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._checked_at = timer()
+        self._files: Dict[str, float] = {}
+        self._parsed: Dict[str, Tuple[float, "Key"]] = {}
+        self._signing: Dict[str, "Key"] = {}
+        self._verification: Dict[str, "Key"] = {}
+        self._active_kid: Optional[str] = None
+
+    # load parses the keys once, the next calls do nothing
+    def load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.algorithm.startswith("HS"):
+                from jose import jwk
+
+                key = jwk.construct(self._secret, self.algorithm)
+                self._signing = {DEFAULT_KID: key}
+                self._verification = {DEFAULT_KID: key}
+                self._active_kid = DEFAULT_KID
+            else:
+                self.reload()
+            self._loaded = True
+
+    # _scan returns the mtime of each file of the keys directory
+    def _scan(self) -> Dict[str, float]:
+        files = {}
+        for name in os.listdir(self.keys_dir):
+            if name.endswith(".pem") or name == "active":
+                files[name] = os.stat(os.path.join(self.keys_dir, name)).st_mtime
+        return files
+
+    # reload parses the new or changed pem files of the keys directory
+    def reload(self):
+        from jose import jwk
+
+        files = self._scan()
+        parsed = {}
+        signing = {}
+        verification = {}
+        for name, mtime in files.items():
+            if not name.endswith(".pem"):
+                continue
+            kid = name[:-len(".pem")]
+            cached = self._parsed.get(kid)
+            if cached is not None and cached[0] == mtime:
+                key = cached[1]
+            else:
+                with open(os.path.join(self.keys_dir, name)) as f:
+                    key = jwk.construct(f.read(), self.algorithm)
+            parsed[kid] = (mtime, key)
+            if key.is_public():
+                verification[kid] = key
+            else:
+                signing[kid] = key
+                verification[kid] = key.public_key()
+
+        active_kid = self._active_kid_env
+        if not active_kid and "active" in files:
+            with open(os.path.join(self.keys_dir, "active")) as f:
+                active_kid = f.read().strip()
+        if not active_kid and self._active_kid in signing:
+            active_kid = self._active_kid
+        elif not active_kid and signing:
+            # without active kid the oldest private key signs and keeps signing, so a new key is only published
+            # until the active kid selects it, once every instance can verify its tokens
+            active_kid = min(signing, key=lambda kid: (parsed[kid][0], kid))
+        if active_kid and active_kid not in signing:
+            raise ValueError(f"the private key of the active kid {active_kid} was not found")
+
+        self._files = files
+        self._parsed = parsed
+        self._signing = signing
+        self._verification = verification
+        self._active_kid = active_kid or None
+        self.version += 1
+
+    # maybe_reload reloads the keys when the files changed, the directory is checked once per reload_seconds.
+    # when the new files are not valid the last keys are kept and the files are read again on the next check
+    def maybe_reload(self):
+        self.load()
+        if not self.keys_dir or self.timer() - self._checked_at < self.reload_seconds:
+            return
+        with self._lock:
+            if self.timer() - self._checked_at < self.reload_seconds:
+                return
+            self._checked_at = self.timer()
+            try:
+                if self._scan() != self._files:
+                    self.reload()
+            except Exception:
+                logger.exception("could not reload the JWT keys, the last keys are kept")
+
+    # signing_key returns the kid and the key that signs new tokens
+    def signing_key(self) -> Tuple[str, "Key"]:
+        self.maybe_reload()
+        if self._active_kid is None:
+            raise ValueError("there is no private key to sign the tokens")
+        return self._active_kid, self._signing[self._active_kid]
+
+    # verification_key returns the key of the kid, tokens without kid are verified with the active key
+    def verification_key(self, kid: Optional[str]) -> Optional["Key"]:
+        self.maybe_reload()
+        if kid is None:
+            kid = self._active_kid
+        return self._verification.get(kid)
+
+    # encode signs the claims with the active key, the kid is sent on the header
+    def encode(self, claims: dict) -> str:
+        from jose import jwt
+
+        kid, key = self.signing_key()
+        return jwt.encode(claims, key, algorithm=self.algorithm, headers={"kid": kid})
+
+    # decode verifies the token with the key of its kid and returns the claims
+    def decode(self, token: str) -> dict:
+        from jose import jwt, JWTError
+
+        try:
+            key = self.verification_key(jwt.get_unverified_header(token).get("kid"))
+            if key is None:
+                raise InvalidToken("the kid of the token is not known")
+            return jwt.decode(token, key, algorithms=[self.algorithm])
+        except JWTError as e:
+            raise InvalidToken(str(e))
+
+
+key_set = KeySet(
+    algorithm=ALGORITHM,
+    secret=SECRET_KEY,
+    keys_dir=JWT_KEYS_DIR,
+    active_kid=JWT_ACTIVE_KID,
+    reload_seconds=JWT_KEYS_RELOAD_SECONDS,
+)
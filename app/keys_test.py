@@ -0,0 +1,152 @@
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwt, JWTError
+
+from .keys import InvalidToken, KeySet
+
+
+def write_key(keys_dir, kid: str, private_key, mtime: float = None):
+    path = os.path.join(keys_dir, f"{kid}.pem")
+    with open(path, "wb") as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def write_public_key(keys_dir, kid: str, private_key):
+    with open(os.path.join(keys_dir, f"{kid}.pem"), "wb") as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+
+
+def sign(key_set: KeySet, claims: dict) -> str:
+    kid, key = key_set.signing_key()
+    return jwt.encode(claims, key, algorithm=key_set.algorithm, headers={"kid": kid})
+
+
+def verify(key_set: KeySet, token: str) -> dict:
+    key = key_set.verification_key(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise JWTError("unknown kid")
+    return jwt.decode(token, key, algorithms=[key_set.algorithm])
+
+
+def test_secret_key():
+    key_set = KeySet(algorithm="HS256", secret="banana")
+    token = sign(key_set, {"id": "1"})
+    assert jwt.get_unverified_header(token)["kid"] == "default"
+    assert verify(key_set, token) == {"id": "1"}
+    assert jwt.decode(token, "banana", algorithms="HS256") == {"id": "1"}
+
+
+def test_rsa_keys(tmp_path):
+    write_key(tmp_path, "one", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    key_set = KeySet(algorithm="RS256", keys_dir=str(tmp_path))
+    token = sign(key_set, {"id": "1"})
+    assert jwt.get_unverified_header(token)["kid"] == "one"
+    assert verify(key_set, token) == {"id": "1"}
+
+
+def test_ec_public_key_only_verifies(tmp_path):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    write_key(tmp_path, "signer", private_key)
+    signer = KeySet(algorithm="ES256", keys_dir=str(tmp_path / ""))
+    token = sign(signer, {"id": "1"})
+
+    verifier_dir = tmp_path / "verifier"
+    verifier_dir.mkdir()
+    write_public_key(verifier_dir, "signer", private_key)
+    verifier = KeySet(algorithm="ES256", keys_dir=str(verifier_dir))
+    assert verify(verifier, token) == {"id": "1"}
+    with pytest.raises(ValueError):
+        verifier.signing_key()
+
+
+def test_rotation(tmp_path):
+    now = [0.0]
+    write_key(tmp_path, "old", ec.generate_private_key(ec.SECP256R1()), mtime=1000)
+    key_set = KeySet(algorithm="ES256", keys_dir=str(tmp_path), reload_seconds=10, timer=lambda: now[0])
+    old_token = sign(key_set, {"id": "1"})
+    version = key_set.version
+
+    # the new key is not seen before the next check of the directory
+    write_key(tmp_path, "new", ec.generate_private_key(ec.SECP256R1()), mtime=2000)
+    assert key_set.verification_key("new") is None
+
+    # the new key is published, the old key keeps signing without active kid
+    now[0] = 10
+    assert key_set.verification_key("new") is not None
+    assert key_set.signing_key()[0] == "old"
+    assert key_set.version == version + 1
+
+    # the active file selects the signing key
+    with open(tmp_path / "active", "w") as f:
+        f.write("new\n")
+    now[0] = 20
+    assert key_set.signing_key()[0] == "new"
+    # the tokens of the old key are valid while the old key is kept
+    assert verify(key_set, old_token) == {"id": "1"}
+    assert verify(key_set, sign(key_set, {"id": "2"})) == {"id": "2"}
+
+    # the last active key keeps signing when the active file is removed
+    os.remove(tmp_path / "active")
+    os.remove(tmp_path / "old.pem")
+    now[0] = 30
+    assert key_set.signing_key()[0] == "new"
+    with pytest.raises(JWTError):
+        verify(key_set, old_token)
+
+
+def test_invalid_reload(tmp_path):
+    # test should keep the last keys when the new files are not valid and read them again on the next check
+    now = [0.0]
+    write_key(tmp_path, "one", ec.generate_private_key(ec.SECP256R1()))
+    key_set = KeySet(algorithm="ES256", keys_dir=str(tmp_path), reload_seconds=10, timer=lambda: now[0])
+    token = sign(key_set, {"id": "1"})
+    version = key_set.version
+
+    with open(tmp_path / "two.pem", "w") as f:
+        f.write("banana")
+    now[0] = 10
+    assert key_set.signing_key()[0] == "one"
+    assert verify(key_set, token) == {"id": "1"}
+    assert key_set.version == version
+
+    write_key(tmp_path, "two", ec.generate_private_key(ec.SECP256R1()))
+    now[0] = 20
+    assert key_set.verification_key("two") is not None
+    assert key_set.signing_key()[0] == "one"
+    assert key_set.version == version + 1
+
+
+def test_invalid_config(tmp_path):
+    with pytest.raises(ValueError):
+        KeySet(algorithm="HS256")
+    with pytest.raises(ValueError):
+        KeySet(algorithm="EdDSA", keys_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        KeySet(algorithm="RS256")
+    # the keys are read on first use
+    key_set = KeySet(algorithm="RS256", keys_dir=str(tmp_path), active_kid="missing")
+    with pytest.raises(ValueError):
+        key_set.load()
+
+
+def test_encode_decode():
+    # test should sign and verify the claims, the invalid tokens raise InvalidToken
+    key_set = KeySet(algorithm="HS256", secret="banana")
+    assert not key_set._loaded
+    assert key_set.decode(key_set.encode({"id": "1"})) == {"id": "1"}
+    with pytest.raises(InvalidToken):
+        key_set.decode(KeySet(algorithm="HS256", secret="pizza").encode({"id": "1"}))
+    with pytest.raises(InvalidToken):
+        key_set.decode("banana")
@@ -0,0 +1,208 @@
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+from typing import List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .env import LOG_QUEUE_SIZE, LOG_LOW_PRIORITY_RATIO
+
+# _context keeps the log fields of the current request, e.g. the request id and the user id. it is a dict set
+# once per request, so the fields bound by the dependencies are seen by the middleware too
+_context: ContextVar[Optional[dict]] = ContextVar("log_context", default=None)
+
+# the attributes of every LogRecord, the other attributes are the extra fields of the record
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+access_logger = logging.getLogger("app.access")
+
+
+# bind_log_context adds the fields to the log records of the current request
+def bind_log_context(**fields):
+    context = _context.get()
+    if context is not None:
+        context.update(fields)
+
+
+# JSONFormatter writes each record as one line of json with the context of the request it was logged on
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        body = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith("_"):
+                body[name] = value
+        if record.exc_info:
+            body["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            body["exception"] = record.exc_text
+        return json.dumps(body, default=str, separators=(",", ":"))
+
+
+# AsyncQueueHandler puts the records on a bounded queue that a background thread writes, so logging never waits
+# on I/O. the records below min_priority_level are sampled by their sample_rate and dropped when the queue is
+# over low_priority_ratio of its size, the other records are dropped only when the queue is full
+class AsyncQueueHandler(logging.Handler):
+    def __init__(self, log_queue: queue.Queue, low_priority_ratio: float = 0.8,
+                 min_priority_level: int = logging.WARNING, sample=random.random):
+        super().__init__()
+        self.queue = log_queue
+        self.low_priority_size = int(log_queue.maxsize * low_priority_ratio)
+        self.min_priority_level = min_priority_level
+        self.sample = sample
+        self.dropped = 0
+        self.sampled_out = 0
+
+    # prepare copies the request context on the record and renders the parts that can not cross threads, the
+    # json is written by the background thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = _context.get()
+        if context:
+            for name, value in context.items():
+                if not hasattr(record, name):
+                    setattr(record, name, value)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        low_priority = record.levelno < self.min_priority_level
+        if low_priority:
+            sample_rate = getattr(record, "sample_rate", None)
+            if sample_rate is not None and self.sample() >= sample_rate:
+                self.sampled_out += 1
+                return
+            if self.queue.qsize() >= self.low_priority_size:
+                self.dropped += 1
+                return
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+# AsyncLogging owns the queue handler and the thread that writes the records
+class AsyncLogging:
+    def __init__(self, logger_name: str = "app", queue_size: int = 10000, low_priority_ratio: float = 0.8):
+        self.logger_name = logger_name
+        self.queue_size = queue_size
+        self.low_priority_ratio = low_priority_ratio
+        self.handler: Optional[AsyncQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped if self.handler is not None else 0
+
+    @property
+    def sampled_out(self) -> int:
+        return self.handler.sampled_out if self.handler is not None else 0
+
+    # start sends the records of the logger to the writer thread, it runs on each worker
+    def start(self, level: str = "INFO", handlers: Optional[List[logging.Handler]] = None):
+        if self.listener is not None:
+            return
+        if handlers is None:
+            stream = logging.StreamHandler(sys.stdout)
+            stream.setFormatter(JSONFormatter())
+            handlers = [stream]
+        log_queue = queue.Queue(maxsize=self.queue_size)
+        self.handler = AsyncQueueHandler(log_queue, low_priority_ratio=self.low_priority_ratio)
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+        logger = logging.getLogger(self.logger_name)
+        logger.setLevel(level)
+        logger.addHandler(self.handler)
+        # the records are not written again by the handlers of the root logger
+        logger.propagate = False
+        self.listener.start()
+
+    # stop writes the records left on the queue and stops the thread
+    def stop(self):
+        if self.listener is None:
+            return
+        logger = logging.getLogger(self.logger_name)
+        logger.removeHandler(self.handler)
+        logger.propagate = True
+        self.listener.stop()
+        self.listener = None
+
+
+# AccessLogMiddleware sets the request id and the log context of each request and logs the request when it
+# ends. the successful and fast requests are sampled, the failed and the slow ones are always logged
+class AccessLogMiddleware:
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, slow_seconds: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = request_id_of(scope)
+        context = {"request_id": request_id}
+        token = _context.set(context)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                message["headers"] = headers + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        def request_extra(duration: float) -> dict:
+            return {"method": scope["method"], "path": scope["path"], "status": status_code,
+                    "duration_ms": round(duration * 1000, 3)}
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            # the error is logged with its traceback and the request, then raised again for the server
+            access_logger.error("request failed", extra=request_extra(time.perf_counter() - start), exc_info=True)
+            raise
+        else:
+            duration = time.perf_counter() - start
+            extra = request_extra(duration)
+            if status_code >= 500:
+                access_logger.error("request failed", extra=extra)
+            elif duration >= self.slow_seconds:
+                access_logger.warning("slow request", extra=extra)
+            elif status_code >= 400:
+                access_logger.info("request", extra=extra)
+            else:
+                access_logger.info("request", extra={**extra, "sample_rate": self.sample_rate})
+        finally:
+            _context.reset(token)
+
+
+# request_id_of returns the X-Request-ID sent by the proxy, or a new one
+def request_id_of(scope: Scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-id" and 0 < len(value) <= 128:
+            return value.decode("latin-1")
+    return uuid.uuid4().hex
+
+
+async_logging = AsyncLogging(queue_size=LOG_QUEUE_SIZE, low_priority_ratio=LOG_LOW_PRIORITY_RATIO)
@@ -0,0 +1,141 @@
+import json
+import logging
+import queue
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from .logs import AccessLogMiddleware, AsyncLogging, AsyncQueueHandler, JSONFormatter, bind_log_context
+
+
+# ListHandler keeps the formatted records
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(JSONFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+
+def make_record(level=logging.INFO, msg="hello %s", args=("banana",), **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter():
+    # test should write the message, the level and the extra fields as one json line
+    line = JSONFormatter().format(make_record(user_id="1"))
+    body = json.loads(line)
+    assert "\n" not in line
+    assert body["message"] == "hello banana"
+    assert body["level"] == "INFO"
+    assert body["logger"] == "app.test"
+    assert body["user_id"] == "1"
+    assert "args" not in body
+
+
+def test_queue_handler_sampling():
+    # test should sample the info records with a sample rate only
+    handler = AsyncQueueHandler(queue.Queue(maxsize=10), sample=lambda: 0.5)
+    handler.handle(make_record(sample_rate=0.1))
+    handler.handle(make_record(sample_rate=0.9))
+    handler.handle(make_record(level=logging.ERROR, sample_rate=0.1))
+    assert handler.queue.qsize() == 2
+    assert handler.sampled_out == 1
+
+
+def test_queue_handler_backpressure():
+    # test should drop the info records first and never block when the queue is full
+    handler = AsyncQueueHandler(queue.Queue(maxsize=4), low_priority_ratio=0.5)
+    for _ in range(3):
+        handler.handle(make_record())
+    assert handler.queue.qsize() == 2
+    for _ in range(3):
+        handler.handle(make_record(level=logging.WARNING))
+    assert handler.queue.qsize() == 4
+    assert handler.dropped == 2
+
+
+def test_queue_handler_prepare():
+    # test should render the message and the exception before the record crosses the thread
+    handler = AsyncQueueHandler(queue.Queue(maxsize=10))
+    try:
+        raise ValueError("pizza")
+    except ValueError:
+        record = make_record(level=logging.ERROR)
+        record.exc_info = sys.exc_info()
+    handler.handle(record)
+    record = handler.queue.get_nowait()
+    assert (record.msg, record.args, record.exc_info) == ("hello banana", None, None)
+    assert "ValueError: pizza" in record.exc_text
+
+
+def test_async_logging():
+    # test should write the records from the background thread and flush them on stop
+    output = ListHandler()
+    async_logging = AsyncLogging(logger_name="app.logs_test", queue_size=100)
+    async_logging.start(handlers=[output])
+    logger = logging.getLogger("app.logs_test")
+    logger.info("one")
+    logger.debug("hidden")
+    async_logging.stop()
+    assert [line["message"] for line in output.lines] == ["one"]
+    assert logger.propagate
+
+
+def test_access_log_middleware():
+    # test should log the request with its id and the user id bound by the route
+    output = ListHandler()
+    async_logging = AsyncLogging(logger_name="app.access", queue_size=100)
+    app = FastAPI()
+    app.add_middleware(AccessLogMiddleware, sample_rate=1.0)
+
+    @app.get("/me")
+    def me():
+        bind_log_context(user_id="42")
+        logging.getLogger("app.access").info("inside")
+        return {}
+
+    async_logging.start(handlers=[output])
+    try:
+        client = TestClient(app)
+        response = client.get("/me", headers={"X-Request-ID": "abc"})
+        assert response.headers["x-request-id"] == "abc"
+        assert len(client.get("/me").headers["x-request-id"]) == 32
+        client.get("/missing")
+    finally:
+        async_logging.stop()
+
+    inside, request = output.lines[:2]
+    assert (inside["message"], inside["request_id"], inside["user_id"]) == ("inside", "abc", "42")
+    assert (request["message"], request["request_id"], request["user_id"]) == ("request", "abc", "42")
+    assert (request["method"], request["path"], request["status"]) == ("GET", "/me", 200)
+    assert output.lines[-1]["status"] == 404
+
+
+def test_access_log_middleware_error():
+    # test should log the error of the route with its traceback and the request id
+    output = ListHandler()
+    async_logging = AsyncLogging(logger_name="app.access", queue_size=100)
+    app = FastAPI()
+    app.add_middleware(AccessLogMiddleware)
+
+    @app.get("/fail")
+    def fail():
+        raise ValueError("pizza")
+
+    async_logging.start(handlers=[output])
+    try:
+        response = TestClient(app, raise_server_exceptions=False).get("/fail", headers={"X-Request-ID": "abc"})
+        assert response.status_code == 500
+    finally:
+        async_logging.stop()
+
+    (failed,) = output.lines
+    assert (failed["message"], failed["level"], failed["request_id"]) == ("request failed", "ERROR", "abc")
+    assert (failed["path"], failed["status"]) == ("/fail", 500)
+    assert "ValueError: pizza" in failed["exception"]
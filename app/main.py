@@ -1,15 +1,187 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from .compression import CompressionMiddleware
+from .env import MONGO_DRIVER, INDEX_RECONCILE_ON_STARTUP, WARMUP_ON_STARTUP, COMPRESSION_ENABLED, \
+    COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY, LOG_ENABLED, LOG_LEVEL, \
+    LOG_ACCESS_SAMPLE_RATE, LOG_ACCESS_SLOW_SECONDS, PROFILE_INTERVAL_MS, PROFILE_REQUEST_MAX_SECONDS
+from .dependencies import token_cache
+from .internal import admin
+from .keys import key_set
+from .logs import AccessLogMiddleware, async_logging
+from .profiler import ProfileMiddleware
+from .metrics import MetricsMiddleware, Gauge, registry
+from .ratelimit import sign_in_ip_limiter, sign_in_email_limiter, sign_in_account_limiter
+from .repositories.mongo.connection import mongo_connection
+from .repositories.mongo.indexes import reconcile_all
+from .repositories.motor.loader import user_loader
+from .routers import health, todos, users
+from .routers.health import loop_lag_monitor
+from .services.password import password_hasher, get_pwd_context, build_dummy_hash
+from .services.revocation import revocation_list
 
-from .routers import users
+logger = logging.getLogger(__name__)
 
 # starts server
 app = FastAPI()
 
+# profiles the requests of the admins sent with the X-Profile header, it is the inner middleware so only the
+# routes are profiled
+app.add_middleware(ProfileMiddleware, interval=PROFILE_INTERVAL_MS / 1000, max_seconds=PROFILE_REQUEST_MAX_SECONDS)
+
+# compresses the responses, the metrics middleware is added after so it wraps it and measures the compression
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_level=COMPRESSION_GZIP_LEVEL,
+                   brotli_quality=COMPRESSION_BROTLI_QUALITY, enabled=COMPRESSION_ENABLED)
+
+# records the duration of each request and its stages
+app.add_middleware(MetricsMiddleware)
+
+# sets the request id and the log context of each request and logs the requests
+app.add_middleware(AccessLogMiddleware, sample_rate=LOG_ACCESS_SAMPLE_RATE, slow_seconds=LOG_ACCESS_SLOW_SECONDS)
+
 # include the routers
+app.include_router(health.router)
 app.include_router(users.router)
+app.include_router(todos.router)
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+
+
+registry.register(Gauge("password_hasher_pending", "password hashes waiting or running",
+                        lambda: password_hasher.pending))
+registry.register(Gauge("password_hasher_rejected", "password hashes rejected because the pool was full",
+                        lambda: password_hasher.stats.rejected))
+registry.register(Gauge("token_cache_hits", "access tokens found on the cache", lambda: token_cache.hits))
+registry.register(Gauge("token_cache_misses", "access tokens not found on the cache",
+                        lambda: token_cache.misses))
+registry.register(Gauge("sign_in_rate_limited", "sign in attempts rejected by the rate limiters",
+                        lambda: sign_in_ip_limiter.rejected + sign_in_email_limiter.rejected +
+                        sign_in_account_limiter.rejected))
+registry.register(Gauge("revoked_tokens", "revoked tokens kept on memory", lambda: len(revocation_list)))
+registry.register(Gauge("revoked_tokens_refresh_errors", "failed refreshes of the revoked tokens",
+                        lambda: revocation_list.refresh_errors))
+registry.register(Gauge("event_loop_lag_seconds", "last measured event loop lag", lambda: loop_lag_monitor.lag))
+registry.register(Gauge("user_loader_loads", "user reads sent to the batching loader", lambda: user_loader.loads))
+registry.register(Gauge("user_loader_batches", "$in queries sent by the batching loader",
+                        lambda: user_loader.batches))
+registry.register(Gauge("log_records_dropped", "log records dropped because the queue was full",
+                        lambda: async_logging.dropped))
+registry.register(Gauge("log_records_sampled_out", "log records not written because of sampling",
+                        lambda: async_logging.sampled_out))
+registry.register(Gauge("mongo_pool_checked_out", "mongo connections in use",
+                        lambda: sum(stats["checked_out"] for stats in mongo_connection.pool_stats().values())))
+
+
+# writes the logs of the app as json from a background thread, it runs first so the other handlers log on it
+@app.on_event("startup")
+def startup_logging():
+    if LOG_ENABLED:
+        async_logging.start(LOG_LEVEL)
+
+
+# opens the mongo client of the configured driver, importing the app does not open sockets
+@app.on_event("startup")
+def startup_mongo():
+    if MONGO_DRIVER == "motor":
+        mongo_connection.async_client
+    else:
+        mongo_connection.client
+
+
+# loads the JWT keys, the password hashing context and the dummy hash, so the first request does not pay for them
+@app.on_event("startup")
+def startup_warmup():
+    if WARMUP_ON_STARTUP:
+        key_set.load()
+        get_pwd_context()
+        build_dummy_hash()
+
+
+# index_db returns the database of the configured driver. motor runs the calls of its pymongo delegate on threads
+# too, so with motor the reconciliation shares the pool of the routes instead of opening a pymongo pool
+def index_db():
+    if MONGO_DRIVER == "motor":
+        return mongo_connection.async_db.delegate
+    return mongo_connection.db
+
+
+# reconcile_indexes creates the missing indexes without blocking the startup
+async def reconcile_indexes():
+    try:
+        await run_in_threadpool(reconcile_all, index_db())
+    except Exception:
+        logger.exception("could not reconcile the indexes")
+
+
+# starts the index reconciliation in background
+@app.on_event("startup")
+async def startup_indexes():
+    if INDEX_RECONCILE_ON_STARTUP:
+        app.state.reconcile_indexes = asyncio.ensure_future(reconcile_indexes())
+
+
+# stops waiting for the index reconciliation, it runs before the mongo clients are closed
+@app.on_event("shutdown")
+async def shutdown_indexes():
+    task = getattr(app.state, "reconcile_indexes", None)
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+# measures the event loop lag for the readiness probe
+@app.on_event("startup")
+def startup_loop_lag_monitor():
+    loop_lag_monitor.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_loop_lag_monitor():
+    await loop_lag_monitor.stop()
+
+
+# keeps the revoked tokens list in sync with the DB
+@app.on_event("startup")
+def startup_revocation_list():
+    revocation_list.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_revocation_list():
+    await revocation_list.stop()
+
+
+# closes the mongo clients
+@app.on_event("shutdown")
+def shutdown_mongo():
+    mongo_connection.close()
+
+
+# stops the password hasher workers
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+
+# writes the logs left on the queue, it runs last so the other handlers can log
+@app.on_event("shutdown")
+def shutdown_logging():
+    async_logging.stop()
 
 
 # root
 @app.get("/")
 async def root():
     return {"message": "Welcome to Gui's TODO app written with FastAPI"}
+
+
+# metrics in the prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return registry.render()
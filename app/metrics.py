@@ -0,0 +1,178 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# UNMATCHED is the path label of the requests that match no route
+UNMATCHED = "unmatched"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# _stages keeps the stage durations of the current request
+_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("stages", default=None)
+
+
+# Histogram is a prometheus histogram with labels
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # one counter per bucket plus +Inf, then the sum
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labelvalues, series in series_items:
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, labelvalues))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            labels = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+
+# Gauge is a prometheus gauge read from a function when the metrics are rendered
+class Gauge:
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+
+    def render(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} gauge\n{self.name} {self.fn()}"
+
+
+# Registry keeps the metrics rendered by the metrics endpoint
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "duration of the http requests", ("method", "path", "status")))
+stage_duration = registry.register(Histogram(
+    "http_request_stage_duration_seconds", "duration of each stage of the http requests", ("stage",)))
+
+
+# record_stage adds the duration to the stage of the current request
+def record_stage(stage: str, seconds: float):
+    stages = _stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+    stage_duration.observe(seconds, stage)
+
+
+# timed records the duration of the block as a stage of the current request
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+# server_timing returns the Server-Timing header value of the stages, durations in milliseconds
+def server_timing(stages: Dict[str, float], total: float) -> str:
+    metrics = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in stages.items()]
+    metrics.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(metrics)
+
+
+# _endpoint_routes keeps the routes of each endpoint by router id, so the route of a request is found from the
+# endpoint set on the scope by the router instead of matching every route again. the routers are not hashable
+_endpoint_routes: Dict[int, Tuple[object, Dict[Callable, list]]] = {}
+
+
+# endpoint_routes returns the routes of the endpoint on the router, the routes are indexed again when the endpoint
+# is missing, e.g. a route added after the first request
+def endpoint_routes(router, endpoint: Callable) -> list:
+    indexed_router, by_endpoint = _endpoint_routes.get(id(router), (None, {}))
+    if indexed_router is not router or endpoint not in by_endpoint:
+        by_endpoint = {}
+        for route in getattr(router, "routes", ()):
+            if hasattr(route, "endpoint") and hasattr(route, "path_format"):
+                by_endpoint.setdefault(route.endpoint, []).append(route)
+        _endpoint_routes[id(router)] = (router, by_endpoint)
+    return by_endpoint.get(endpoint, [])
+
+
+# route_path returns the path template of the route of the request, e.g. /todos/{todo_id}, so the ids sent by the
+# clients do not create new series. it is called after the request is routed, the requests that match no route
+# share the UNMATCHED label
+def route_path(scope: Scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None or "router" not in scope:
+        return UNMATCHED
+    routes = endpoint_routes(scope["router"], endpoint)
+    if len(routes) == 1:
+        return routes[0].path_format
+    # the endpoint serves many routes, only its own routes are matched
+    for route in routes:
+        if route.matches(scope)[0] != Match.NONE:
+            return route.path_format
+    return UNMATCHED
+
+
+# MetricsMiddleware records the duration of each request and adds the Server-Timing header
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages = {}
+        token = _stages.set(stages)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing = server_timing(stages, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _stages.reset(token)
+            request_duration.observe(time.perf_counter() - start, scope["method"], route_path(scope),
+                                     str(status_code))
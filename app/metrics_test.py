@@ -0,0 +1,76 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from .metrics import UNMATCHED, Histogram, Gauge, Registry, _stages, record_stage, route_path, server_timing, timed
+
+
+def test_histogram_render():
+    # test should render the cumulative buckets, the sum and the count
+    histogram = Histogram("test_seconds", "test histogram", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "mongo")
+    histogram.observe(0.1, "mongo")
+    histogram.observe(5, "mongo")
+    lines = histogram.render().splitlines()
+    assert lines[:2] == ["# HELP test_seconds test histogram", "# TYPE test_seconds histogram"]
+    assert 'test_seconds_bucket{stage="mongo",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{stage="mongo",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="mongo",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{stage="mongo"} 5.15' in lines
+    assert 'test_seconds_count{stage="mongo"} 3' in lines
+
+
+def test_registry_render():
+    # test should render all the metrics
+    registry = Registry()
+    registry.register(Gauge("test_gauge", "test gauge", lambda: 3))
+    assert registry.render() == "# HELP test_gauge test gauge\n# TYPE test_gauge gauge\ntest_gauge 3\n"
+
+
+def test_timed():
+    # test should add the stage durations to the current request
+    stages = {}
+    token = _stages.set(stages)
+    with timed("mongo"):
+        pass
+    record_stage("mongo", 1.0)
+    _stages.reset(token)
+    assert stages["mongo"] >= 1.0
+
+
+def test_timed_without_request():
+    # test should not fail outside of a request
+    with pytest.raises(ValueError):
+        with timed("mongo"):
+            raise ValueError()
+
+
+def test_server_timing():
+    # test should return the header value in milliseconds
+    assert server_timing({"mongo": 0.0015}, 0.002) == "mongo;dur=1.500, total;dur=2.000"
+
+
+def test_route_path():
+    # test should return the template of the routed endpoint, also when the endpoint serves many routes
+    app = FastAPI()
+    paths = []
+
+    @app.middleware("http")
+    async def record_path(request, call_next):
+        response = await call_next(request)
+        paths.append(route_path(request.scope))
+        return response
+
+    @app.get("/items/{item_id}")
+    @app.get("/things/{item_id}")
+    def item(item_id: str):
+        return {}
+
+    @app.get("/other/{other_id}")
+    def other(other_id: str):
+        return {}
+
+    client = TestClient(app)
+    for path in ("/items/1", "/things/2", "/other/3", "/missing"):
+        client.get(path)
+    assert paths == ["/items/{item_id}", "/things/{item_id}", "/other/{other_id}", UNMATCHED]
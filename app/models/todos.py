@@ -0,0 +1,71 @@
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .users import MongoModel, OID
+from ..env import TODO_BATCH_MAX_IDS
+
+
+# TodoIn describes the schema of Todo input
+class TodoIn(BaseModel):
+    title: str = Field(..., min_length=1, max_length=500)
+    description: Optional[str]
+    due_date: Optional[datetime]
+
+
+# Todo describes the schema of Todo output and in DB
+class Todo(MongoModel):
+    id: Optional[OID] = Field()
+    owner_id: OID
+    title: str
+    description: Optional[str]
+    completed: bool = False
+    created_at: datetime
+    completed_at: Optional[datetime]
+    due_date: Optional[datetime]
+
+
+# TodoPage describes a page of Todos, next_cursor is sent to get the next page
+class TodoPage(BaseModel):
+    items: List[Todo]
+    next_cursor: Optional[str]
+
+
+# TodoBatch describes the Todos to complete, reopen and delete with one request
+class TodoBatch(BaseModel):
+    complete: List[str] = Field([], max_items=TODO_BATCH_MAX_IDS)
+    reopen: List[str] = Field([], max_items=TODO_BATCH_MAX_IDS)
+    delete: List[str] = Field([], max_items=TODO_BATCH_MAX_IDS)
+
+
+# TodoBatchResult describes the number of Todos changed by the batch
+class TodoBatchResult(BaseModel):
+    modified: int
+    deleted: int
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# todo_dict returns the Todo json fields of a trusted document, without building the model
+def todo_dict(document: dict) -> dict:
+    body = {name: _json_value(document.get(name)) for name in Todo.__fields__}
+    body['id'] = str(document['_id'])
+    body['owner_id'] = str(document['owner_id'])
+    return body
+
+
+# todo_json returns the Todo json of a trusted document
+def todo_json(document: dict) -> bytes:
+    return json.dumps(todo_dict(document), separators=(',', ':')).encode()
+
+
+# todo_page_json returns the TodoPage json of trusted documents
+def todo_page_json(documents: Iterable[dict], next_cursor: Optional[str]) -> bytes:
+    page = {"items": [todo_dict(document) for document in documents], "next_cursor": next_cursor}
+    return json.dumps(page, separators=(',', ':')).encode()
@@ -1,8 +1,9 @@
 import datetime
+import json
 from typing import Optional
 
 from bson.objectid import ObjectId, InvalidId
-from pydantic import BaseModel, EmailStr, Field, BaseConfig
+from pydantic import BaseModel, EmailStr, Field, BaseConfig, validator
 
 
 class MongoModel(BaseModel):
@@ -21,6 +22,17 @@ class MongoModel(BaseModel):
         id = data.pop('_id', None)
         return cls(**dict(data, id=id))
 
+    @classmethod
+    def from_mongo_trusted(cls, data: dict):
+        """Builds the model from data that came from the DB without validating it again.
+        It accepts a document (with "_id") or the fields of another model (with "id")."""
+        if not data:
+            return data
+        values = {name: data[name] for name in cls.__fields__ if name in data}
+        if '_id' in data:
+            values['id'] = data['_id']
+        return cls.construct(**values)
+
     def mongo(self, **kwargs):
         exclude_unset = kwargs.pop('exclude_unset', True)
         by_alias = kwargs.pop('by_alias', True)
@@ -67,6 +79,21 @@ class UserIn(BaseModel):
     phone_number: Optional[str]
 
 
+# UserUpdate describes the schema of the User changes, only the sent fields are changed and the optional
+# fields sent as null are removed
+class UserUpdate(BaseModel):
+    name: Optional[str]
+    display_name: Optional[str]
+    photo_url: Optional[str]
+    phone_number: Optional[str]
+
+    @validator('name', pre=True)
+    def name_not_null(cls, v):
+        if v is None:
+            raise ValueError("name can not be removed")
+        return v
+
+
 # UserSignIn describes the schema of User input
 class UserSignIn(BaseModel):
     email: EmailStr
@@ -83,6 +110,23 @@ class User(MongoModel):
     phone_number: Optional[str]
 
 
+# user_json returns the User json of a trusted document or User fields, without building the model
+def user_json(data: dict) -> bytes:
+    body = {name: data.get(name) for name in User.__fields__}
+    _id = data.get('_id', data.get('id'))
+    body['id'] = str(_id) if _id is not None else None
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+# ADMIN_ROLE is the role of the users that can use the admin tools, the roles are set on the user document
+ADMIN_ROLE = "admin"
+
+
+# is_admin checks if the user document has the admin role
+def is_admin(document: Optional[dict]) -> bool:
+    return document is not None and ADMIN_ROLE in document.get("roles", ())
+
+
 # UserInDB describes the schema of User in DB
 class UserInDB(MongoModel):
     id: Optional[OID] = Field()
@@ -92,3 +136,10 @@ class UserInDB(MongoModel):
     display_name: Optional[str]
     photo_url: Optional[str]
     phone_number: Optional[str]
+
+
+# UserCreateResult describes the result of one User of a batch insert, it has the user or the error
+class UserCreateResult(BaseModel):
+    index: int
+    user: Optional[UserInDB]
+    error: Optional[dict]
@@ -0,0 +1,35 @@
+import json
+
+from bson import ObjectId
+
+from .users import User, UserInDB, user_json
+
+document = {
+    '_id': ObjectId('507f1f77bcf86cd799439011'),
+    'email': 'test@example.com',
+    'hashed_password': 'iuhasiuhdhiuasihud',
+    'name': 'test',
+    'phone_number': '01028969112',
+}
+
+
+def test_from_mongo_trusted():
+    # test should build the same model as from_mongo
+    assert UserInDB.from_mongo_trusted(document) == UserInDB.from_mongo(dict(document))
+    assert User.from_mongo_trusted(document) == User.from_mongo(dict(document))
+    assert '_id' in document
+
+
+def test_from_mongo_trusted_model():
+    # test should build the model from the fields of another model
+    user_in_db = UserInDB.from_mongo(dict(document))
+    user = User.from_mongo_trusted(user_in_db.__dict__)
+    assert user == User.from_mongo(dict(document))
+    assert not hasattr(user, 'hashed_password')
+
+
+def test_user_json():
+    # test should return the same json as the User model
+    expected = json.loads(User.from_mongo(dict(document)).json())
+    assert json.loads(user_json(document)) == expected
+    assert json.loads(user_json(UserInDB.from_mongo(dict(document)).__dict__)) == expected
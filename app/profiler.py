@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .dependencies import get_token_data
+from .env import COOKIE_ACCESS_KEY
+from .models.users import is_admin
+from .repositories.motor import users as user_repo
+
+logger = logging.getLogger(__name__)
+
+# WAITING is the stack of the samples taken while the profiled task was not running, e.g. waiting for the DB
+WAITING = "(waiting)"
+
+# profile_slot allows one profile at a time on each worker, so profiling can not pile up threads
+profile_slot = threading.Lock()
+
+_frame_names: Dict[object, str] = {}
+
+
+# short_path returns the path from the site-packages or the working directory, so the names are short
+def short_path(path: str) -> str:
+    _, marker, rest = path.rpartition("site-packages" + os.sep)
+    if marker:
+        return rest
+    cwd = os.getcwd() + os.sep
+    return path[len(cwd):] if path.startswith(cwd) else path
+
+
+# frame_name returns the name of the function of the frame, the names are kept by code object
+def frame_name(code) -> str:
+    name = _frame_names.get(code)
+    if name is None:
+        # the collapsed format splits the frames on ";"
+        name = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+        _frame_names[code] = name
+    return name
+
+
+# collapse returns the stack of the frame from the root, the frames are separated by ";"
+def collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# SamplingProfiler samples the stacks of the threads from a background thread, the profiled code is not
+# instrumented and nothing runs when no profile is taken. with thread_id only that thread is sampled and with
+# task the samples taken while the task is not running on its loop are counted as WAITING
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_seconds: float = 60, thread_id: Optional[int] = None,
+                 task: Optional[asyncio.Task] = None):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.thread_id = thread_id
+        self.task = task
+        self.loop = task.get_loop() if task is not None else None
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    def sample(self, own_thread_id: Optional[int] = None):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id or (self.thread_id is not None and thread_id != self.thread_id):
+                continue
+            if self.task is not None and asyncio.current_task(self.loop) is not self.task:
+                stack = WAITING
+            else:
+                stack = collapse(frame)
+            key = f"{names.get(thread_id, thread_id)};{stack}"
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def _run(self):
+        own_thread_id = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            self.sample(own_thread_id)
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.seconds = time.monotonic() - self._started_at
+
+    # collapsed returns the profile in the collapsed stacks format of flamegraph.pl, one "stack count" per line
+    def collapsed(self) -> str:
+        lines = [f"{stack} {count}" for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    # speedscope returns the profile in the speedscope sampled format, it can be opened on https://speedscope.app
+    def speedscope(self, name: str = "profile") -> dict:
+        frames: Dict[str, int] = {}
+        samples = []
+        for stack in self.stacks:
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack.split(";")])
+        weights = [count * self.interval for count in self.stacks.values()]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": frame} for frame in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+        }
+
+
+# is_admin_request checks if the access cookie of the request belongs to an admin, the token and the user are
+# read through their caches
+async def is_admin_request(scope: Scope) -> bool:
+    request = Request(scope)
+    try:
+        token_data = get_token_data(request.cookies.get(COOKIE_ACCESS_KEY))
+    except Exception:
+        return False
+    # the collection follows the dependency overrides of the app, like the routes
+    get_collection = scope["app"].dependency_overrides.get(user_repo.get_user_collection,
+                                                           user_repo.get_user_collection)
+    return is_admin(await user_repo.find_one_document(get_collection(), token_data.id))
+
+
+# ProfileMiddleware profiles the requests of admins sent with the X-Profile header and logs the collapsed
+# stacks of the request with its request id. the other requests only pay for the header lookup
+class ProfileMiddleware:
+    def __init__(self, app: ASGIApp, interval: float = 0.005, max_seconds: float = 10):
+        self.app = app
+        self.interval = interval
+        self.max_seconds = max_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not any(name == b"x-profile" for name, _ in scope.get("headers", [])):
+            await self.app(scope, receive, send)
+            return
+        if not await is_admin_request(scope) or not profile_slot.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = SamplingProfiler(interval=self.interval, max_seconds=self.max_seconds,
+                                    thread_id=threading.get_ident(), task=asyncio.current_task())
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            profile_slot.release()
+            # it is logged as a warning, so it is not dropped with the info records under load
+            logger.warning("request profile", extra={"path": scope["path"], "samples": profiler.samples,
+                                                     "seconds": round(profiler.seconds, 3),
+                                                     "stacks": profiler.collapsed()})
@@ -0,0 +1,82 @@
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+from .profiler import WAITING, SamplingProfiler, collapse, frame_name, short_path
+
+
+def busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_collapse():
+    # test should name the frames from the root to the current function
+    def inner():
+        return collapse(sys._getframe())
+
+    stack = inner().split(";")
+    assert stack[-1] == frame_name(inner.__code__)
+    assert stack[-1].startswith("inner (")
+    assert frame_name(test_collapse.__code__) in stack
+    assert short_path("/usr/lib/python3/site-packages/fastapi/routing.py") == "fastapi/routing.py"
+
+
+def test_sampling_profiler():
+    # test should sample the stacks of the other threads
+    stop = threading.Event()
+    thread = threading.Thread(target=busy, args=(stop,), name="busy")
+    thread.start()
+    profiler = SamplingProfiler(interval=0.001)
+    try:
+        profiler.start()
+        time.sleep(0.05)
+    finally:
+        profiler.stop()
+        stop.set()
+        thread.join()
+
+    assert profiler.samples > 0
+    assert any(stack.startswith("busy;") and frame_name(busy.__code__) in stack for stack in profiler.stacks)
+    assert not any("sampling-profiler" in stack for stack in profiler.stacks)
+
+    lines = profiler.collapsed().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == sum(profiler.stacks.values())
+
+    speedscope = profiler.speedscope()
+    frames = speedscope["shared"]["frames"]
+    sampled = speedscope["profiles"][0]
+    assert len(sampled["samples"]) == len(sampled["weights"]) == len(profiler.stacks)
+    assert all(0 <= index < len(frames) for sample in sampled["samples"] for index in sample)
+
+
+def test_max_seconds():
+    # test should stop sampling after max_seconds
+    profiler = SamplingProfiler(interval=0.001, max_seconds=0.01)
+    profiler.start()
+    time.sleep(0.05)
+    samples = profiler.samples
+    time.sleep(0.02)
+    profiler.stop()
+    assert profiler.samples == samples
+
+
+@pytest.mark.asyncio
+async def test_task_profile():
+    # test should sample the loop thread only and count the time the task is waiting
+    profiler = SamplingProfiler(thread_id=threading.get_ident(), task=asyncio.current_task())
+    profiler.sample()
+    (stack,) = profiler.stacks
+    assert stack.startswith("MainThread;")
+    assert frame_name(test_task_profile.__code__) in stack
+    assert stack.endswith(frame_name(SamplingProfiler.sample.__code__))
+
+    async def other():
+        profiler.sample()
+
+    await asyncio.ensure_future(other())
+    assert profiler.stacks["MainThread;" + WAITING] == 1
+
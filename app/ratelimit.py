@@ -0,0 +1,126 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from fastapi import HTTPException, Request, status
+
+from .env import SIGN_IN_RATE_LIMIT_ENABLED, SIGN_IN_IP_BURST, SIGN_IN_IP_PER_MINUTE, SIGN_IN_EMAIL_BURST, \
+    SIGN_IN_EMAIL_PER_MINUTE, SIGN_IN_ACCOUNT_BURST, SIGN_IN_ACCOUNT_PER_MINUTE, RATE_LIMIT_MAX_KEYS
+
+
+# BucketStore is the interface of the token bucket storage, a shared store (e.g. redis) must implement take
+# atomically so all the instances share the same buckets
+class BucketStore:
+    # take removes one token of the bucket and returns 0, or the seconds to wait when the bucket is empty
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        raise NotImplementedError
+
+    # peek returns 0 when the bucket has a token, or the seconds to wait, without taking the token
+    async def peek(self, key: str, capacity: int, refill_per_second: float) -> float:
+        raise NotImplementedError
+
+
+# MemoryBucketStore keeps the buckets on the process memory, the least recently used buckets are dropped
+class MemoryBucketStore(BucketStore):
+    def __init__(self, max_keys: int = 100000, timer=time.monotonic):
+        self.max_keys = max_keys
+        self.timer = timer
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def _tokens(self, key: str, capacity: int, refill_per_second: float, now: float) -> float:
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        return min(capacity, tokens + (now - updated_at) * refill_per_second)
+
+    async def peek(self, key: str, capacity: int, refill_per_second: float) -> float:
+        tokens = self._tokens(key, capacity, refill_per_second, self.timer())
+        return 0.0 if tokens >= 1 else (1 - tokens) / refill_per_second
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        now = self.timer()
+        tokens = self._tokens(key, capacity, refill_per_second, now)
+
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / refill_per_second
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+# RateLimiter limits the requests of each key with a token bucket
+class RateLimiter:
+    def __init__(self, store: BucketStore, name: str, capacity: int, per_minute: float, enabled: bool = True):
+        self.store = store
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = per_minute / 60
+        self.enabled = enabled
+        self.rejected = 0
+
+    # hit takes one token of the key and raises too many requests when the bucket is empty
+    async def hit(self, key: str):
+        if not self.enabled:
+            return
+        self._reject(await self.store.take(f"{self.name}:{key}", self.capacity, self.refill_per_second))
+
+    # check raises too many requests when the bucket of the key is empty, without taking a token
+    async def check(self, key: str):
+        if not self.enabled:
+            return
+        self._reject(await self.store.peek(f"{self.name}:{key}", self.capacity, self.refill_per_second))
+
+    # charge takes one token of the key, it never raises so the current request is answered as it is
+    async def charge(self, key: str):
+        if self.enabled:
+            await self.store.take(f"{self.name}:{key}", self.capacity, self.refill_per_second)
+
+    def _reject(self, retry_after: float):
+        if retry_after:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="too many sign in attempts, try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+bucket_store = MemoryBucketStore(max_keys=RATE_LIMIT_MAX_KEYS)
+sign_in_ip_limiter = RateLimiter(bucket_store, "sign-in-ip", SIGN_IN_IP_BURST, SIGN_IN_IP_PER_MINUTE,
+                                 enabled=SIGN_IN_RATE_LIMIT_ENABLED)
+sign_in_email_limiter = RateLimiter(bucket_store, "sign-in-email", SIGN_IN_EMAIL_BURST, SIGN_IN_EMAIL_PER_MINUTE,
+                                    enabled=SIGN_IN_RATE_LIMIT_ENABLED)
+sign_in_account_limiter = RateLimiter(bucket_store, "sign-in-account", SIGN_IN_ACCOUNT_BURST,
+                                      SIGN_IN_ACCOUNT_PER_MINUTE, enabled=SIGN_IN_RATE_LIMIT_ENABLED)
+
+
+# client_ip returns the ip of the client of the request, the server reads it from X-Forwarded-For when the
+# request comes from one of the WEB_TRUSTED_PROXIES
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+# email_key returns the key of the email bucket, it is kept per client ip so the failed attempts of others can not
+# lock the owner of the email out
+def email_key(request: Request, email: str) -> str:
+    return f"{client_ip(request)}:{email.lower()}"
+
+
+# check_sign_in_rate rejects the sign in when the client ip made too many attempts, or when the email had too many
+# failed attempts from the client ip or from every ip. the email buckets are only checked here, they are charged
+# by record_failed_sign_in
+async def check_sign_in_rate(request: Request, email: str):
+    await sign_in_ip_limiter.hit(client_ip(request))
+    await sign_in_email_limiter.check(email_key(request, email))
+    await sign_in_account_limiter.check(email.lower())
+
+
+# record_failed_sign_in charges the email buckets for a wrong email or password
+async def record_failed_sign_in(request: Request, email: str):
+    await sign_in_email_limiter.charge(email_key(request, email))
+    await sign_in_account_limiter.charge(email.lower())
@@ -0,0 +1,86 @@
+import pytest
+from fastapi import HTTPException, Request, status
+
+from .env import SIGN_IN_ACCOUNT_BURST
+from .ratelimit import MemoryBucketStore, RateLimiter, check_sign_in_rate, record_failed_sign_in
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_bucket_take():
+    # test should allow the burst and then refill over time
+    timer = FakeTimer()
+    store = MemoryBucketStore(timer=timer)
+    assert await store.take('banana', 2, 1) == 0
+    assert await store.take('banana', 2, 1) == 0
+    assert await store.take('banana', 2, 1) == 1
+    timer.now = 1
+    assert await store.take('banana', 2, 1) == 0
+    assert await store.take('pizza', 2, 1) == 0
+
+
+@pytest.mark.asyncio
+async def test_bucket_max_keys():
+    # test should drop the least recently used buckets
+    store = MemoryBucketStore(max_keys=2)
+    for key in ('banana', 'pizza', 'burger'):
+        await store.take(key, 1, 1)
+    assert list(store._buckets) == ['pizza', 'burger']
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter():
+    # test should raise too many requests with retry after
+    limiter = RateLimiter(MemoryBucketStore(timer=FakeTimer()), 'test', capacity=1, per_minute=30)
+    await limiter.hit('banana')
+    with pytest.raises(HTTPException) as e:
+        await limiter.hit('banana')
+    assert e.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert e.value.headers['Retry-After'] == '2'
+    assert limiter.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_disabled():
+    # test should not limit when disabled
+    limiter = RateLimiter(MemoryBucketStore(), 'test', capacity=1, per_minute=1, enabled=False)
+    for _ in range(3):
+        await limiter.hit('banana')
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_check():
+    # test should raise on check only after the tokens are charged
+    limiter = RateLimiter(MemoryBucketStore(timer=FakeTimer()), 'test', capacity=2, per_minute=60)
+    for _ in range(3):
+        await limiter.check('banana')
+    await limiter.charge('banana')
+    await limiter.charge('banana')
+    await limiter.charge('banana')
+    with pytest.raises(HTTPException) as e:
+        await limiter.check('banana')
+    assert e.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert limiter.rejected == 1
+
+
+def new_request(ip: str) -> Request:
+    return Request({"type": "http", "client": (ip, 0), "headers": []})
+
+
+@pytest.mark.asyncio
+async def test_sign_in_rate_many_ips():
+    # test should limit the failed attempts on one email from many ips
+    email = 'account@aaaa.com'
+    for n in range(SIGN_IN_ACCOUNT_BURST):
+        await check_sign_in_rate(new_request(f'10.0.0.{n}'), email)
+        await record_failed_sign_in(new_request(f'10.0.0.{n}'), email)
+    with pytest.raises(HTTPException) as e:
+        await check_sign_in_rate(new_request('10.0.1.1'), email)
+    assert e.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
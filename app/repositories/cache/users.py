@@ -0,0 +1,95 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+from ...cache import TTLCache
+from ...env import PROFILE_CACHE_ENABLED, PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL_SECONDS
+
+
+# ProfileCacheBackend is the interface of the profile cache storage, a shared backend (e.g. redis)
+# must implement these methods storing the mongo documents
+class ProfileCacheBackend:
+    async def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def set(self, key: str, document: dict, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+
+# MemoryProfileBackend stores the profiles on the process memory
+class MemoryProfileBackend(ProfileCacheBackend):
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[dict]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, document: dict, ttl: float):
+        self.cache.set(key, document, ttl=ttl)
+
+    async def delete(self, key: str):
+        self.cache.delete(key)
+
+    async def clear(self):
+        self.cache.clear()
+
+
+# UserProfileCache is a read-through cache of user documents, concurrent misses on the same key share one load
+class UserProfileCache:
+    def __init__(self, backend: ProfileCacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    # get_or_load returns a copy of the cached document or loads it, documents not found are not cached
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        if not self.enabled:
+            return await loader()
+
+        document = await self.backend.get(key)
+        if document is not None:
+            return dict(document)
+
+        # the load runs on its own task shared by the concurrent misses, so a cancelled caller (e.g. a client
+        # disconnect) does not cancel the load of the others
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._load(key, loader))
+        document = await asyncio.shield(task)
+        return dict(document) if document is not None else None
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        task = asyncio.current_task()
+        try:
+            document = await loader()
+            # the document is not stored if the key was invalidated while loading
+            if document is not None and self._inflight.get(key) is task:
+                await self.backend.set(key, document, self.ttl)
+            return document
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    # invalidate removes the key from the cache
+    async def invalidate(self, key: str):
+        self._inflight.pop(key, None)
+        if self.enabled:
+            await self.backend.delete(key)
+
+
+profile_cache = UserProfileCache(
+    backend=MemoryProfileBackend(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL_SECONDS),
+    ttl=PROFILE_CACHE_TTL_SECONDS,
+    enabled=PROFILE_CACHE_ENABLED,
+)
+
+
+# profile_key returns the cache key of the user on the collection
+def profile_key(collection, user_id) -> str:
+    return f"{collection.name}:{user_id}"
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from .users import MemoryProfileBackend, UserProfileCache
+
+
+def create_cache():
+    return UserProfileCache(backend=MemoryProfileBackend(maxsize=10, ttl=10), ttl=10)
+
+
+# create_loader returns a loader that counts the calls
+def create_loader(document, calls):
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return document
+
+    return loader
+
+
+@pytest.mark.asyncio
+async def test_get_or_load():
+    # test should load the document once and return copies
+    cache = create_cache()
+    calls = []
+    loader = create_loader({'_id': 1, 'name': 'test'}, calls)
+    first = await cache.get_or_load('users:1', loader)
+    first.pop('_id')
+    second = await cache.get_or_load('users:1', loader)
+    assert second == {'_id': 1, 'name': 'test'}
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_stampede():
+    # test should share one load between concurrent misses
+    cache = create_cache()
+    calls = []
+    loader = create_loader({'_id': 1}, calls)
+    results = await asyncio.gather(*[cache.get_or_load('users:1', loader) for _ in range(10)])
+    assert results == [{'_id': 1}] * 10
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_cancelled_caller():
+    # test should keep loading for the other callers when the first caller is cancelled
+    cache = create_cache()
+    calls = []
+    loader = create_loader({'_id': 1}, calls)
+    first = asyncio.ensure_future(cache.get_or_load('users:1', loader))
+    other = asyncio.ensure_future(cache.get_or_load('users:1', loader))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await other == {'_id': 1}
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert await cache.backend.get('users:1') == {'_id': 1}
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_not_found():
+    # test should not cache documents not found
+    cache = create_cache()
+    calls = []
+    loader = create_loader(None, calls)
+    assert await cache.get_or_load('users:1', loader) is None
+    assert await cache.get_or_load('users:1', loader) is None
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate():
+    # test should load again after invalidate
+    cache = create_cache()
+    calls = []
+    loader = create_loader({'_id': 1}, calls)
+    await cache.get_or_load('users:1', loader)
+    await cache.invalidate('users:1')
+    await cache.get_or_load('users:1', loader)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_while_loading():
+    # test should not store a document invalidated while loading
+    cache = create_cache()
+    calls = []
+    loader = create_loader({'_id': 1}, calls)
+    load = asyncio.ensure_future(cache.get_or_load('users:1', loader))
+    await asyncio.sleep(0)
+    await cache.invalidate('users:1')
+    assert await load == {'_id': 1}
+    assert await cache.backend.get('users:1') is None
+
+
+@pytest.mark.asyncio
+async def test_disabled():
+    # test should always call the loader when disabled
+    cache = create_cache()
+    cache.enabled = False
+    calls = []
+    loader = create_loader({'_id': 1}, calls)
+    await cache.get_or_load('users:1', loader)
+    await cache.get_or_load('users:1', loader)
+    assert len(calls) == 2
@@ -0,0 +1,47 @@
+from .connection import MongoConnection
+from .monitoring import PoolStats
+
+
+def test_connection_is_lazy():
+    # test should not create any client before first use
+    connection = MongoConnection('mongodb://localhost:27017/', 'todos', max_pool_size=10, compressors='zlib')
+    assert connection._client is None
+    assert connection._async_client is None
+    assert connection.options['compressors'] == 'zlib'
+    assert connection.pool_stats() == {}
+
+
+def test_connection_close():
+    # test should create the client on first use and close it
+    connection = MongoConnection('mongodb://localhost:27017/', 'todos', max_pool_size=10,
+                                 server_selection_timeout_ms=10)
+    assert connection.db.name == 'todos'
+    assert connection.pool_stats()['pymongo']['max_pool_size'] == 10
+    connection.close()
+    assert connection._client is None
+
+
+def test_pool_stats():
+    # test should count the pool events
+    stats = PoolStats()
+    stats.connection_created(None)
+    stats.connection_check_out_started(None)
+    stats.connection_checked_out(None)
+    assert stats.dict()['checked_out'] == 1
+    assert stats.dict()['waiting'] == 0
+    stats.connection_checked_in(None)
+    stats.connection_check_out_started(None)
+    stats.connection_check_out_failed(None)
+    assert stats.dict() == {'open': 1, 'checked_out': 0, 'waiting': 0, 'checkout_failures': 1, 'pool_clears': 0}
+
+
+def test_connection_reset_after_fork():
+    # test should open a new client after the fork instead of reusing the inherited one
+    connection = MongoConnection('mongodb://localhost:27017/', 'todos', server_selection_timeout_ms=10)
+    inherited = connection.client
+    connection.reset_after_fork()
+    assert connection._client is None
+    assert connection.pool_stats() == {}
+    assert connection.client is not inherited
+    connection.close()
+    inherited.close()
@@ -0,0 +1,151 @@
+import argparse
+import json
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# pymongo.ASCENDING and DESCENDING, pymongo is not imported so the registry can be imported without loading
+# the driver
+ASCENDING = 1
+DESCENDING = -1
+
+
+# IndexSpec describes one index of a collection and the query it serves
+class IndexSpec:
+    def __init__(self, name: str, keys: list, query: str, **options):
+        self.name = name
+        self.keys = keys
+        self.query = query
+        self.options = options
+
+    # matches checks if the index information returned by mongo is the same index
+    def matches(self, info: dict) -> bool:
+        if [tuple(key) for key in info.get("key", [])] != [tuple(key) for key in self.keys]:
+            return False
+        for option in ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds"):
+            if info.get(option) != self.options.get(option):
+                return False
+        return True
+
+    def create(self, collection):
+        collection.create_index(self.keys, name=self.name, **self.options)
+
+
+# INDEXES is the registry of the indexes of each collection, new queries must declare their indexes here
+INDEXES: Dict[str, List[IndexSpec]] = {}
+
+
+# register adds the indexes of the collection to the registry
+def register(collection_name: str, *specs: IndexSpec):
+    INDEXES.setdefault(collection_name, []).extend(specs)
+
+
+register(
+    "users",
+    IndexSpec("email_unique", [("email", ASCENDING)],
+              query="find_one_by_email (sign in), find_many (admin users list) by email prefix, unique email",
+              unique=True),
+    # users without phone number are not indexed, so many users can have no phone number
+    IndexSpec("phone_number_unique", [("phone_number", ASCENDING)], query="unique phone number", unique=True,
+              partialFilterExpression={"phone_number": {"$type": "string"}}),
+    IndexSpec("name_id", [("name", ASCENDING), ("_id", ASCENDING)], query="find_many (admin users list) by name"),
+)
+
+register(
+    "todos",
+    # the _id breaks the ties of created_at, so the keyset pagination is served by the index only
+    IndexSpec("owner_created_at", [("owner_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              query="find_page (todos list of the user)"),
+    IndexSpec("owner_completed_created_at",
+              [("owner_id", ASCENDING), ("completed", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+              query="find_page with completed filter"),
+)
+
+register(
+    "revoked_tokens",
+    # mongo deletes the revocations when the token expires
+    IndexSpec("expires_at_ttl", [("expires_at", ASCENDING)], query="expired revocations cleanup",
+              expireAfterSeconds=0),
+    IndexSpec("revoked_at", [("revoked_at", ASCENDING)], query="find_revoked_since (revocation list refresh)"),
+)
+
+
+# index_usage returns the number of operations served by each index, None when $indexStats is not supported
+def index_usage(collection) -> Optional[Dict[str, int]]:
+    from pymongo import errors
+
+    try:
+        return {stats["name"]: stats["accesses"]["ops"] for stats in collection.aggregate([{"$indexStats": {}}])}
+    except (errors.OperationFailure, NotImplementedError):
+        return None
+
+
+# reconcile creates the missing indexes of the collection and reports the unexpected and unused ones,
+# unexpected indexes (or declared ones with other options) are dropped only if drop_unexpected is set
+def reconcile(collection, specs: List[IndexSpec], drop_unexpected: bool = False, dry_run: bool = False) -> dict:
+    existing = collection.index_information()
+    report = {"created": [], "missing": [], "conflicting": [], "unexpected": [], "dropped": [], "unused": None}
+
+    for spec in specs:
+        info = existing.get(spec.name)
+        if info is not None and spec.matches(info):
+            continue
+        if info is not None:
+            report["conflicting"].append(spec.name)
+            if not drop_unexpected or dry_run:
+                continue
+            collection.drop_index(spec.name)
+            report["dropped"].append(spec.name)
+        report["missing"].append(spec.name)
+        if not dry_run:
+            spec.create(collection)
+            report["created"].append(spec.name)
+
+    declared = {spec.name for spec in specs}
+    for name in existing:
+        if name == "_id_" or name in declared:
+            continue
+        report["unexpected"].append(name)
+        if drop_unexpected and not dry_run:
+            collection.drop_index(name)
+            report["dropped"].append(name)
+
+    usage = index_usage(collection)
+    if usage is not None:
+        report["unused"] = sorted(name for name, ops in usage.items() if not ops and name != "_id_")
+
+    return report
+
+
+# reconcile_all reconciles the indexes of all the registered collections of the database
+def reconcile_all(db, drop_unexpected: bool = False, dry_run: bool = False) -> Dict[str, dict]:
+    reports = {}
+    for collection_name, specs in INDEXES.items():
+        reports[collection_name] = reconcile(db[collection_name], specs, drop_unexpected, dry_run)
+        logger.info("indexes of %s reconciled: %s", collection_name, reports[collection_name])
+    return reports
+
+
+# create_indexes creates the registered indexes of collection_name on the collection
+def create_indexes(collection, collection_name: str = "users"):
+    for spec in INDEXES[collection_name]:
+        spec.create(collection)
+
+
+# reconciles the indexes from the command line, e.g. python -m app.repositories.mongo.indexes --dry-run
+def main(argv=None):
+    from .connection import mongo_connection
+
+    parser = argparse.ArgumentParser(description="reconcile the mongo indexes with the registry")
+    parser.add_argument("--dry-run", action="store_true", help="only report, do not create or drop indexes")
+    parser.add_argument("--drop-unexpected", action="store_true", help="drop the indexes that are not declared")
+    args = parser.parse_args(argv)
+
+    reports = reconcile_all(mongo_connection.db, drop_unexpected=args.drop_unexpected, dry_run=args.dry_run)
+    print(json.dumps(reports, indent=2))
+    mongo_connection.close()
+
+
+if __name__ == "__main__":
+    main()
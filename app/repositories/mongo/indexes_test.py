@@ -0,0 +1,69 @@
+import pytest
+from mongomock import MongoClient
+from pymongo import ASCENDING, errors
+
+from .indexes import IndexSpec, INDEXES, create_indexes, reconcile, reconcile_all
+
+specs = [
+    IndexSpec("email_unique", [("email", ASCENDING)], query="by email", unique=True),
+    IndexSpec("name", [("name", ASCENDING)], query="by name"),
+]
+
+
+def test_reconcile_creates_missing():
+    # test should create the missing indexes and report them
+    collection = MongoClient().db.collection
+    report = reconcile(collection, specs)
+    assert report['created'] == ['email_unique', 'name']
+    assert set(collection.index_information()) == {'_id_', 'email_unique', 'name'}
+
+    # test should do nothing when the indexes exist
+    report = reconcile(collection, specs)
+    assert report['created'] == []
+    assert report['missing'] == []
+
+
+def test_reconcile_dry_run():
+    # test should only report the missing indexes
+    collection = MongoClient().db.collection
+    report = reconcile(collection, specs, dry_run=True)
+    assert report['missing'] == ['email_unique', 'name']
+    assert report['created'] == []
+    assert 'email_unique' not in collection.index_information()
+
+
+def test_reconcile_unexpected():
+    # test should report the unexpected indexes and drop them only when asked
+    collection = MongoClient().db.collection
+    collection.create_index([("email", ASCENDING), ("phone_number", ASCENDING)], unique=True)
+    collection.create_index([("name", ASCENDING)], name="name", unique=True)
+
+    report = reconcile(collection, specs)
+    assert report['unexpected'] == ['email_1_phone_number_1']
+    assert report['conflicting'] == ['name']
+    assert 'email_1_phone_number_1' in collection.index_information()
+
+    report = reconcile(collection, specs, drop_unexpected=True)
+    assert set(report['dropped']) == {'email_1_phone_number_1', 'name'}
+    assert set(collection.index_information()) == {'_id_', 'email_unique', 'name'}
+    assert not collection.index_information()['name'].get('unique')
+
+
+def test_reconcile_all():
+    # test should reconcile all the registered collections
+    db = MongoClient().db
+    reports = reconcile_all(db)
+    assert set(reports) == set(INDEXES)
+
+
+def test_users_indexes():
+    # test should enforce unique email and phone number, but allow many users without phone number
+    collection = MongoClient().db.collection
+    create_indexes(collection)
+    collection.insert_one({'email': 'a@example.com', 'phone_number': None})
+    collection.insert_one({'email': 'b@example.com'})
+    collection.insert_one({'email': 'c@example.com', 'phone_number': '01028969112'})
+    with pytest.raises(errors.DuplicateKeyError):
+        collection.insert_one({'email': 'a@example.com', 'phone_number': '01000000000'})
+    with pytest.raises(errors.DuplicateKeyError):
+        collection.insert_one({'email': 'd@example.com', 'phone_number': '01028969112'})
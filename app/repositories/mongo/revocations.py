@@ -0,0 +1,9 @@
+from .connection import mongo_connection
+from ...env import MONGO_DRIVER
+
+
+# get_revoked_token_collection returns the revoked tokens collection of the configured driver
+def get_revoked_token_collection():
+    if MONGO_DRIVER == "motor":
+        return mongo_connection.async_db.revoked_tokens
+    return mongo_connection.db.revoked_tokens
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from .connection import mongo_connection
+from .users import check_valid_id
+from ...env import MONGO_DRIVER
+
+EPOCH = datetime(1970, 1, 1)
+
+
+# get_todo_collection returns the Todo collection of the configured driver
+def get_todo_collection():
+    if MONGO_DRIVER == "motor":
+        return mongo_connection.async_db.todos
+    return mongo_connection.db.todos
+
+
+# now returns the current date truncated to milliseconds, the precision of the mongo dates, so the dates of
+# the created Todos are the same ones that are read back and used on the cursors
+def now() -> datetime:
+    date = datetime.utcnow()
+    return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+
+# encode_cursor returns the cursor of the page that starts after the Todo
+def encode_cursor(document: dict) -> str:
+    created_at = document["created_at"]
+    return f"{(created_at - EPOCH) // timedelta(milliseconds=1)}.{document['_id']}"
+
+
+# decode_cursor returns the created_at and the id of the cursor
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    millis, _, _id = cursor.partition(".")
+    if not millis.isdigit() or not ObjectId.is_valid(_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="the cursor is not valid")
+    return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(_id)
+
+
+# page_query returns the filter of the Todos of the owner after the cursor, newest first, it is served by
+# the (owner_id, created_at, _id) indexes
+def page_query(owner_id: str, after: Optional[str] = None, completed: Optional[bool] = None) -> dict:
+    check_valid_id(owner_id)
+    query = {"owner_id": ObjectId(owner_id)}
+    if completed is not None:
+        query["completed"] = completed
+    if after is not None:
+        created_at, _id = decode_cursor(after)
+        query["$or"] = [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "_id": {"$lt": _id}}]
+    return query
+
+
+# owned_ids_query returns the filter of the Todos of the ids that belong to the owner
+def owned_ids_query(owner_id: str, ids) -> dict:
+    check_valid_id(owner_id)
+    for _id in ids:
+        check_valid_id(_id)
+    return {"_id": {"$in": [ObjectId(_id) for _id in ids]}, "owner_id": ObjectId(owner_id)}
@@ -1,14 +1,22 @@
+from typing import TYPE_CHECKING, List, Optional
+
 from bson import ObjectId
 from fastapi import HTTPException, status
-from pymongo import errors
 
-from .connection import db
-from ...models.users import UserInDB
+from .connection import mongo_connection
+from ...env import MONGO_DRIVER
+from ...models.users import UserInDB, UserCreateResult
+
+if TYPE_CHECKING:
+    from pymongo.collection import Collection
+    from pymongo.errors import BulkWriteError
 
 
-# get_user_collection returns the User collection
+# get_user_collection returns the User collection of the configured driver
 def get_user_collection():
-    return db.users
+    if MONGO_DRIVER == "motor":
+        return mongo_connection.async_db.users
+    return mongo_connection.db.users
 
 
 # check_valid_id checks if the id is a valid id
@@ -17,25 +25,75 @@ def check_valid_id(_id: str):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="the id is not valid")
 
 
-#  create_one creates one User on DB
-def create_one(collection: db.users, user: UserInDB):
+#  create_one creates one User on DB, the stored user is built from the inserted document
+#  unless read_back is set, then it is read from the server
+def create_one(collection: "Collection", user: UserInDB, read_back: bool = False):
+    # pymongo is imported on first use, so importing the app does not load the driver
+    from pymongo import errors
+
     # if has attr id, deletes before insert on db
     if hasattr(user, 'id'):
         delattr(user, 'id')
+    document = user.mongo()
     try:
         # inserts on db
-        ret = collection.insert_one(user.mongo())
+        ret = collection.insert_one(document)
     except errors.DuplicateKeyError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=[e.details])
 
     # add the generated id
-    stored_user = collection.find_one({"_id": ret.inserted_id})
+    if read_back:
+        document = collection.find_one({"_id": ret.inserted_id})
+    else:
+        document["_id"] = ret.inserted_id
 
-    return UserInDB.from_mongo(stored_user)
+    return UserInDB.from_mongo(document)
+
+
+# new_documents returns the documents of the users with their ids, so no read is needed after the insert
+def new_documents(users: List[UserInDB]) -> List[dict]:
+    documents = []
+    for user in users:
+        document = user.mongo(exclude={'id'})
+        document["_id"] = ObjectId()
+        documents.append(document)
+    return documents
+
+
+# create_many_results maps the insert_many errors to the result of each user
+def create_many_results(documents: List[dict], error: "BulkWriteError" = None) -> List[UserCreateResult]:
+    write_errors = {}
+    if error is not None:
+        for write_error in error.details.get('writeErrors', []):
+            # the op is not returned because it has the hashed password
+            write_errors[write_error['index']] = {key: write_error[key] for key in
+                                                  ('code', 'errmsg', 'keyPattern', 'keyValue') if key in write_error}
+
+    results = []
+    for index, document in enumerate(documents):
+        if index in write_errors:
+            results.append(UserCreateResult(index=index, error=write_errors[index]))
+        else:
+            results.append(UserCreateResult(index=index, user=UserInDB.from_mongo(dict(document))))
+    return results
+
+
+# create_many creates many Users with one unordered insert, the errors (e.g. duplicated key) are reported by user
+def create_many(collection: "Collection", users: List[UserInDB]) -> List[UserCreateResult]:
+    from pymongo import errors
+
+    documents = new_documents(users)
+    if not documents:
+        return []
+    try:
+        collection.insert_many(documents, ordered=False)
+    except errors.BulkWriteError as e:
+        return create_many_results(documents, e)
+    return create_many_results(documents)
 
 
 # delete_one deletes one User from DB
-def delete_one(collection: db.users, user_id: str):
+def delete_one(collection: "Collection", user_id: str):
     check_valid_id(user_id)
     result = collection.delete_one({"_id": ObjectId(user_id)})
     if result.deleted_count:
@@ -43,8 +101,45 @@ def delete_one(collection: db.users, user_id: str):
     return False
 
 
+# update_query returns the filter of the User, at the expected version when it is set. version 0 is a User that
+# was never updated, so it has no version field
+def update_query(user_id: str, version: Optional[int] = None) -> dict:
+    check_valid_id(user_id)
+    query = {"_id": ObjectId(user_id)}
+    if version == 0:
+        query["version"] = {"$exists": False}
+    elif version is not None:
+        query["version"] = version
+    return query
+
+
+# update_document returns the update of the changed fields only, the fields set to None are removed.
+# the version is incremented on each update, so the updates based on an older read can be rejected
+def update_document(changes: dict) -> dict:
+    update = {"$inc": {"version": 1}}
+    set_fields = {name: value for name, value in changes.items() if value is not None}
+    unset_fields = {name: "" for name, value in changes.items() if value is None}
+    if set_fields:
+        update["$set"] = set_fields
+    if unset_fields:
+        update["$unset"] = unset_fields
+    return update
+
+
+# update_one updates the changed fields of one User and returns the updated document, or None when the User
+# is not found or is not at the expected version
+def update_one(collection: "Collection", user_id: str, changes: dict, version: Optional[int] = None):
+    from pymongo import ReturnDocument, errors
+
+    query = update_query(user_id, version)
+    try:
+        return collection.find_one_and_update(query, update_document(changes), return_document=ReturnDocument.AFTER)
+    except errors.DuplicateKeyError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=[e.details])
+
+
 # find_one finds one User from DB or return null
-def find_one(collection: db.user, user_id: str):
+def find_one(collection: "Collection", user_id: str):
     check_valid_id(user_id)
     stored_user = collection.find_one({"_id": ObjectId(user_id)})
     if stored_user is None:
@@ -53,7 +148,7 @@ def find_one(collection: db.user, user_id: str):
 
 
 # find_one_by_email finds one user by its email
-def find_one_by_email(collection: db.user, email: str):
+def find_one_by_email(collection: "Collection", email: str):
     stored_user = collection.find_one({"email": email})
     if stored_user is None:
         return None
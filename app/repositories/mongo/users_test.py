@@ -3,7 +3,8 @@ from fastapi import HTTPException, status
 from mongomock import MongoClient
 
 from .connection import create_indexes
-from .users import create_one, delete_one, find_one, get_user_collection, check_valid_id, find_one_by_email
+from .users import create_one, create_many, delete_one, find_one, get_user_collection, check_valid_id, \
+    find_one_by_email, update_one, update_document
 from ...models.users import UserInDB
 
 collection = MongoClient().db.collection
@@ -103,3 +104,46 @@ def test_find_one_by_email_wrong_email():
     # test should return None if the user is not registered
     stored_user = find_one_by_email(collection, 'pizza@burguer.com')
     assert stored_user is None
+
+
+def test_create_one_read_back():
+    # test should read the stored user from the DB
+    user = new_user.copy(update={'email': 'read@example.com', 'phone_number': '01000000000'})
+    stored_user = create_one(collection, user, read_back=True)
+    assert stored_user.id == collection.find_one({'email': 'read@example.com'})['_id']
+
+
+def test_create_many():
+    # test should create the users and report the duplicated ones
+    users = [
+        new_user.copy(update={'email': 'many1@example.com', 'phone_number': '01000000001'}),
+        new_user.copy(update={'email': 'many1@example.com', 'phone_number': '01000000002'}),
+        new_user.copy(update={'email': 'many2@example.com', 'phone_number': '01000000003'}),
+    ]
+    results = create_many(collection, users)
+    assert [result.index for result in results] == [0, 1, 2]
+    assert results[0].user.email == 'many1@example.com'
+    assert results[1].user is None
+    assert results[1].error['code'] == 11000
+    assert results[2].user.id == collection.find_one({'email': 'many2@example.com'})['_id']
+
+
+def test_create_many_empty():
+    # test should not insert anything
+    assert create_many(collection, []) == []
+
+
+def test_update_document():
+    # test should set the sent fields, remove the null ones and increment the version
+    assert update_document({'name': 'banana', 'photo_url': None}) == {
+        '$inc': {'version': 1}, '$set': {'name': 'banana'}, '$unset': {'photo_url': ''}}
+
+
+def test_update_one():
+    # test should return the updated user only on the expected version
+    coll = MongoClient().db.collection
+    user = create_one(coll, new_user.copy())
+    document = update_one(coll, str(user.id), {'name': 'banana'}, version=0)
+    assert document['name'] == 'banana' and document['version'] == 1
+    assert update_one(coll, str(user.id), {'name': 'pizza'}, version=0) is None
+    assert update_one(coll, str(user.id), {'name': 'pizza'}, version=1)['name'] == 'pizza'
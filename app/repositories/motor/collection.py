@@ -0,0 +1,78 @@
+from itertools import islice
+
+from starlette.concurrency import run_in_threadpool
+
+
+# is_motor checks if the collection is already a motor collection
+def is_motor(collection) -> bool:
+    return type(collection).__module__.startswith("motor")
+
+
+# AsyncCursor wraps a blocking cursor with the motor cursor api
+class AsyncCursor:
+    def __init__(self, cursor, batch_size: int = 100):
+        self._cursor = cursor
+        self._batch_size = batch_size
+        self._buffer = []
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit: int):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def skip(self, skip: int):
+        self._cursor = self._cursor.skip(skip)
+        return self
+
+    # to_list returns up to length documents, all of them if length is None
+    async def to_list(self, length=None):
+        return await run_in_threadpool(lambda: list(islice(self._cursor, length)))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # fetches the documents in batches, so each thread hop returns many documents
+        if not self._buffer:
+            self._buffer = await self.to_list(self._batch_size)
+            if not self._buffer:
+                raise StopAsyncIteration
+            self._buffer.reverse()
+        return self._buffer.pop()
+
+
+# AsyncCollection wraps a blocking collection (pymongo or mongomock) with the motor collection api,
+# each call runs on the thread pool so it does not block the event loop
+class AsyncCollection:
+    def __init__(self, collection):
+        self.delegate = collection
+
+    @property
+    def name(self):
+        return self.delegate.name
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.delegate.find(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs):
+        return AsyncCursor(self.delegate.aggregate(*args, **kwargs))
+
+    def __getattr__(self, item):
+        method = getattr(self.delegate, item)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        return call
+
+
+# as_async returns a collection that can be awaited, motor collections are returned untouched
+def as_async(collection):
+    if isinstance(collection, AsyncCollection) or is_motor(collection):
+        return collection
+    return AsyncCollection(collection)
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from .collection import as_async
+from ...env import USER_LOADER_ENABLED, USER_LOADER_MAX_BATCH_SIZE
+from ...metrics import timed
+
+
+# collection_key returns the key of the collection of the batch, motor returns a new collection object on each
+# access so the collections are compared by client and full name
+def collection_key(collection) -> Tuple[int, str]:
+    return id(collection.database.client), collection.full_name
+
+
+# Batch has the ids to load from one collection and the future of each id
+class Batch:
+    def __init__(self, collection):
+        self.collection = collection
+        self.futures: Dict[ObjectId, asyncio.Future] = {}
+
+
+# DocumentLoader loads documents by id, the loads issued on the same event loop iteration are sent as one
+# {"_id": {"$in": [...]}} query per collection. the same id is read once and its document is shared by the
+# callers, each one gets its own copy
+class DocumentLoader:
+    def __init__(self, max_batch_size: int = 1000, enabled: bool = True):
+        self.max_batch_size = max_batch_size
+        self.enabled = enabled
+        self.batches = 0
+        self.loads = 0
+        self._pending: Dict[Tuple[int, str], Batch] = {}
+
+    async def load(self, collection, _id: ObjectId) -> Optional[dict]:
+        collection = as_async(collection)
+        if not self.enabled:
+            with timed("mongo"):
+                return await collection.find_one({"_id": _id})
+
+        loop = asyncio.get_event_loop()
+        if not self._pending:
+            # the batch is sent after the tasks that are ready on this iteration have run
+            loop.call_soon(self._dispatch)
+        batch = self._pending.setdefault(collection_key(collection), Batch(collection))
+        future = batch.futures.get(_id)
+        if future is None:
+            future = batch.futures[_id] = loop.create_future()
+        self.loads += 1
+
+        # a cancelled caller does not cancel the load of the other callers
+        with timed("mongo"):
+            document = await asyncio.shield(future)
+        return dict(document) if document is not None else None
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        for batch in pending.values():
+            ids = list(batch.futures)
+            for start in range(0, len(ids), self.max_batch_size):
+                asyncio.ensure_future(self._run(batch, ids[start:start + self.max_batch_size]))
+
+    async def _run(self, batch: Batch, ids: List[ObjectId]):
+        self.batches += 1
+        futures = [batch.futures[_id] for _id in ids]
+        try:
+            cursor = batch.collection.find({"_id": {"$in": ids}})
+            documents = {document["_id"]: document for document in await cursor.to_list(length=None)}
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+                    # avoids the "exception was never retrieved" warning when all the callers were cancelled
+                    future.exception()
+            return
+        for _id, future in zip(ids, futures):
+            if not future.done():
+                future.set_result(documents.get(_id))
+
+
+user_loader = DocumentLoader(max_batch_size=USER_LOADER_MAX_BATCH_SIZE, enabled=USER_LOADER_ENABLED)
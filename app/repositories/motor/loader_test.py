@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from mongomock import MongoClient
+
+from .collection import as_async
+from .loader import DocumentLoader
+
+
+# CountingCollection counts the queries sent to the collection
+class CountingCollection:
+    def __init__(self, collection):
+        self.delegate = collection
+        self.finds = []
+
+    def __getattr__(self, item):
+        return getattr(self.delegate, item)
+
+    def find(self, *args, **kwargs):
+        self.finds.append(args[0])
+        return self.delegate.find(*args, **kwargs)
+
+
+def new_collection(count: int):
+    coll = MongoClient().db.users
+    ids = coll.insert_many([{"n": n} for n in range(count)]).inserted_ids
+    return CountingCollection(coll), ids
+
+
+@pytest.mark.asyncio
+async def test_load_batches_one_tick():
+    # test should read the concurrent loads with one query and share the documents of the same id
+    coll, ids = new_collection(3)
+    loader = DocumentLoader()
+    missing = ObjectId()
+    documents = await asyncio.gather(*(loader.load(coll, _id) for _id in [ids[0], ids[1], ids[0], missing, ids[2]]))
+
+    assert [document["n"] if document else None for document in documents] == [0, 1, 0, None, 2]
+    assert documents[0] is not documents[2]
+    assert len(coll.finds) == 1
+    assert sorted(coll.finds[0]["_id"]["$in"]) == sorted([ids[0], ids[1], missing, ids[2]])
+    assert (loader.loads, loader.batches) == (5, 1)
+
+    # the next tick is another batch
+    assert (await loader.load(coll, ids[1]))["n"] == 1
+    assert len(coll.finds) == 2
+
+
+@pytest.mark.asyncio
+async def test_load_max_batch_size():
+    # test should split the large batches
+    coll, ids = new_collection(5)
+    loader = DocumentLoader(max_batch_size=2)
+    documents = await asyncio.gather(*(loader.load(coll, _id) for _id in ids))
+    assert [document["n"] for document in documents] == [0, 1, 2, 3, 4]
+    assert [len(query["_id"]["$in"]) for query in coll.finds] == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_load_collections():
+    # test should send one query per collection
+    first, first_ids = new_collection(1)
+    second, second_ids = new_collection(1)
+    loader = DocumentLoader()
+    documents = await asyncio.gather(loader.load(first, first_ids[0]), loader.load(second, first_ids[0]),
+                                     loader.load(as_async(second), second_ids[0]))
+    assert documents[0]["_id"] == first_ids[0]
+    assert documents[1] is None
+    assert documents[2]["_id"] == second_ids[0]
+    assert len(first.finds) == 1 and len(second.finds) == 1
+
+
+@pytest.mark.asyncio
+async def test_load_error():
+    # test should raise the error of the query on each caller
+    coll, ids = new_collection(1)
+
+    def find(*args, **kwargs):
+        raise RuntimeError("banana")
+
+    coll.find = find
+    loader = DocumentLoader()
+    results = await asyncio.gather(loader.load(coll, ids[0]), loader.load(coll, ObjectId()), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_load_cancelled_caller():
+    # test should keep loading for the other callers when one is cancelled
+    coll, ids = new_collection(1)
+    loader = DocumentLoader()
+    cancelled = asyncio.ensure_future(loader.load(coll, ids[0]))
+    other = asyncio.ensure_future(loader.load(coll, ids[0]))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    assert (await other)["n"] == 0
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+
+@pytest.mark.asyncio
+async def test_load_disabled():
+    # test should read each load on its own when disabled
+    coll, ids = new_collection(2)
+    loader = DocumentLoader(enabled=False)
+    documents = await asyncio.gather(*(loader.load(coll, _id) for _id in ids))
+    assert [document["n"] for document in documents] == [0, 1]
+    assert coll.finds == []
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import List
+
+from .collection import as_async
+from ...metrics import timed
+from ..mongo.revocations import get_revoked_token_collection
+
+__all__ = ["get_revoked_token_collection", "revoke", "is_revoked", "find_revoked_since"]
+
+
+# revoke stores the revoked token id until the token expires, it returns False if the token was already revoked
+async def revoke(collection, jti: str, expires_at: datetime, revoked_at: datetime) -> bool:
+    with timed("mongo"):
+        result = await as_async(collection).update_one(
+            {"_id": jti},
+            {"$setOnInsert": {"expires_at": expires_at, "revoked_at": revoked_at}},
+            upsert=True,
+        )
+    return result.upserted_id is not None
+
+
+# is_revoked checks on the DB if the token id was revoked
+async def is_revoked(collection, jti: str) -> bool:
+    with timed("mongo"):
+        return await as_async(collection).find_one({"_id": jti}, {"_id": 1}) is not None
+
+
+# find_revoked_since returns the revocations made since the date, oldest first
+async def find_revoked_since(collection, since: datetime) -> List[dict]:
+    cursor = as_async(collection).find({"revoked_at": {"$gte": since}}).sort("revoked_at", 1)
+    with timed("mongo"):
+        return await cursor.to_list(length=None)
@@ -0,0 +1,76 @@
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+
+from .collection import as_async
+from ...metrics import timed
+from ..mongo.todos import get_todo_collection, now, encode_cursor, page_query, owned_ids_query
+from ..mongo.users import check_valid_id
+from ...models.todos import TodoIn
+
+__all__ = ["get_todo_collection", "create_one", "find_one", "find_page", "apply_batch"]
+
+
+# create_one creates one Todo of the owner, the stored Todo is built from the inserted document
+async def create_one(collection, owner_id: str, todo_in: TodoIn) -> dict:
+    check_valid_id(owner_id)
+    document = {
+        "owner_id": ObjectId(owner_id),
+        "title": todo_in.title,
+        "description": todo_in.description,
+        "completed": False,
+        "created_at": now(),
+        "completed_at": None,
+        "due_date": todo_in.due_date,
+    }
+    with timed("mongo"):
+        ret = await as_async(collection).insert_one(document)
+    document["_id"] = ret.inserted_id
+    return document
+
+
+# find_one finds one Todo of the owner, the Todos of other users are not found
+async def find_one(collection, owner_id: str, todo_id: str) -> Optional[dict]:
+    query = owned_ids_query(owner_id, [todo_id])
+    with timed("mongo"):
+        return await as_async(collection).find_one(query)
+
+
+# find_page returns a page of the Todos of the owner, newest first, and the cursor of the next page.
+# the page is read with one query, one more Todo is read to know if there is a next page
+async def find_page(collection, owner_id: str, after: Optional[str] = None, limit: int = 100,
+                    completed: Optional[bool] = None) -> Tuple[List[dict], Optional[str]]:
+    query = page_query(owner_id, after, completed)
+    cursor = as_async(collection).find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1)
+    with timed("mongo"):
+        documents = await cursor.to_list(length=limit + 1)
+    if len(documents) > limit:
+        documents = documents[:limit]
+        return documents, encode_cursor(documents[-1])
+    return documents, None
+
+
+# apply_batch completes, reopens and deletes the Todos of the owner with one unordered bulk write, the ids of
+# other users are ignored. it returns the number of modified and deleted Todos
+async def apply_batch(collection, owner_id: str, complete: List[str], reopen: List[str],
+                      delete: List[str]) -> Tuple[int, int]:
+    # pymongo is imported on first use, so importing the app does not load the driver
+    from pymongo import DeleteMany, UpdateMany
+
+    operations = []
+    if complete:
+        query = owned_ids_query(owner_id, complete)
+        query["completed"] = False
+        operations.append(UpdateMany(query, {"$set": {"completed": True, "completed_at": now()}}))
+    if reopen:
+        query = owned_ids_query(owner_id, reopen)
+        query["completed"] = True
+        operations.append(UpdateMany(query, {"$set": {"completed": False, "completed_at": None}}))
+    if delete:
+        operations.append(DeleteMany(owned_ids_query(owner_id, delete)))
+    if not operations:
+        return 0, 0
+
+    with timed("mongo"):
+        result = await as_async(collection).bulk_write(operations, ordered=False)
+    return result.modified_count, result.deleted_count
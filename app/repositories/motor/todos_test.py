@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException, status
+from mongomock import MongoClient
+
+from .todos import create_one, find_one, find_page, apply_batch
+from ..mongo.connection import create_indexes
+from ..mongo.todos import decode_cursor, encode_cursor
+from ...models.todos import TodoIn
+
+owner_id = str(ObjectId())
+other_id = str(ObjectId())
+
+
+# new_collection returns an empty mock collection with the todos indexes
+def new_collection():
+    coll = MongoClient().db.todos
+    create_indexes(coll, "todos")
+    return coll
+
+
+def test_cursor():
+    # test should encode and decode the created_at and the id of the last Todo
+    document = {"_id": ObjectId(), "created_at": datetime(2021, 3, 4, 5, 6, 7, 8000)}
+    assert decode_cursor(encode_cursor(document)) == (document["created_at"], document["_id"])
+    for cursor in ("banana", "1.banana", "-1." + str(ObjectId())):
+        with pytest.raises(HTTPException) as e:
+            decode_cursor(cursor)
+        assert e.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_create_and_find_one():
+    # test should find the Todo only for its owner
+    coll = new_collection()
+    document = await create_one(coll, owner_id, TodoIn(title="buy milk"))
+    assert document["completed"] is False
+    stored = await find_one(coll, owner_id, str(document["_id"]))
+    assert stored == document
+    assert await find_one(coll, other_id, str(document["_id"])) is None
+
+
+@pytest.mark.asyncio
+async def test_find_page():
+    # test should walk all the pages without skipping Todos created on the same millisecond
+    coll = new_collection()
+    created_at = datetime(2021, 1, 1)
+    coll.insert_many([{"owner_id": ObjectId(owner_id), "title": str(n), "completed": n % 2 == 0,
+                       "created_at": created_at if n < 5 else datetime(2021, 1, 2)} for n in range(8)])
+    coll.insert_one({"owner_id": ObjectId(other_id), "title": "other", "completed": False, "created_at": created_at})
+
+    titles, after = [], None
+    while True:
+        documents, after = await find_page(coll, owner_id, after=after, limit=3)
+        titles += [document["title"] for document in documents]
+        if after is None:
+            break
+    assert titles == ["7", "6", "5", "4", "3", "2", "1", "0"]
+
+    documents, after = await find_page(coll, owner_id, limit=10, completed=True)
+    assert [document["title"] for document in documents] == ["6", "4", "2", "0"]
+    assert after is None
+
+
+@pytest.mark.asyncio
+async def test_apply_batch():
+    # test should complete, reopen and delete the Todos of the owner only
+    coll = new_collection()
+    ids = [str((await create_one(coll, owner_id, TodoIn(title=str(n))))["_id"]) for n in range(4)]
+    other = str((await create_one(coll, other_id, TodoIn(title="other")))["_id"])
+    coll.update_one({"_id": ObjectId(ids[1])}, {"$set": {"completed": True}})
+
+    modified, deleted = await apply_batch(coll, owner_id, complete=[ids[0], other], reopen=[ids[1]],
+                                          delete=[ids[2], other])
+    assert (modified, deleted) == (2, 1)
+    assert (await find_one(coll, owner_id, ids[0]))["completed"] is True
+    assert (await find_one(coll, owner_id, ids[0]))["completed_at"] is not None
+    assert (await find_one(coll, owner_id, ids[1]))["completed"] is False
+    assert await find_one(coll, owner_id, ids[2]) is None
+    assert (await find_one(coll, other_id, other))["completed"] is False
+
+    assert await apply_batch(coll, owner_id, complete=[], reopen=[], delete=[]) == (0, 0)
+    with pytest.raises(HTTPException):
+        await apply_batch(coll, owner_id, complete=["banana"], reopen=[], delete=[])
@@ -0,0 +1,163 @@
+import re
+from typing import AsyncIterator, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from .collection import as_async
+from ...metrics import timed
+from .loader import user_loader
+from ..cache.users import profile_cache, profile_key
+from ..mongo.users import get_user_collection, check_valid_id, new_documents, create_many_results, update_query, \
+    update_document
+from ...models.users import User, UserInDB, UserCreateResult
+
+__all__ = ["get_user_collection", "check_valid_id", "create_one", "create_many", "delete_one", "find_one",
+           "find_one_document", "find_one_by_email", "find_many", "page_sort", "update_one", "update_password_hash"]
+
+
+#  create_one creates one User on DB, the stored user is built from the inserted document
+#  unless read_back is set, then it is read from the server
+async def create_one(collection, user: UserInDB, read_back: bool = False):
+    # pymongo is imported on first use, so importing the app does not load the driver
+    from pymongo import errors
+
+    collection = as_async(collection)
+    # if has attr id, deletes before insert on db
+    if hasattr(user, 'id'):
+        delattr(user, 'id')
+    document = user.mongo()
+    try:
+        # inserts on db
+        with timed("mongo"):
+            ret = await collection.insert_one(document)
+    except errors.DuplicateKeyError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=[e.details])
+
+    # add the generated id
+    if read_back:
+        with timed("mongo"):
+            document = await collection.find_one({"_id": ret.inserted_id})
+    else:
+        document["_id"] = ret.inserted_id
+    await profile_cache.invalidate(profile_key(collection, ret.inserted_id))
+
+    return UserInDB.from_mongo_trusted(document)
+
+
+# create_many creates many Users with one unordered insert, the errors (e.g. duplicated key) are reported by user
+async def create_many(collection, users: List[UserInDB]) -> List[UserCreateResult]:
+    from pymongo import errors
+
+    documents = new_documents(users)
+    if not documents:
+        return []
+    try:
+        with timed("mongo"):
+            await as_async(collection).insert_many(documents, ordered=False)
+    except errors.BulkWriteError as e:
+        return create_many_results(documents, e)
+    return create_many_results(documents)
+
+
+# delete_one deletes one User from DB
+async def delete_one(collection, user_id: str):
+    check_valid_id(user_id)
+    collection = as_async(collection)
+    with timed("mongo"):
+        result = await collection.delete_one({"_id": ObjectId(user_id)})
+    await profile_cache.invalidate(profile_key(collection, user_id))
+    if result.deleted_count:
+        return True
+    return False
+
+
+# find_one_document finds the User document, it is read through the profile cache
+async def find_one_document(collection, user_id: str) -> Optional[dict]:
+    check_valid_id(user_id)
+    collection = as_async(collection)
+
+    # the concurrent reads of other users are batched with this one
+    async def load():
+        return await user_loader.load(collection, ObjectId(user_id))
+
+    return await profile_cache.get_or_load(profile_key(collection, user_id), load)
+
+
+# find_one finds one User from DB or return null
+async def find_one(collection, user_id: str):
+    stored_user = await find_one_document(collection, user_id)
+    if stored_user is None:
+        return None
+    return UserInDB.from_mongo_trusted(stored_user)
+
+
+# find_one_by_email finds one user by its email
+async def find_one_by_email(collection, email: str):
+    with timed("mongo"):
+        stored_user = await as_async(collection).find_one({"email": email})
+    if stored_user is None:
+        return None
+    return UserInDB.from_mongo_trusted(stored_user)
+
+
+# update_one updates the changed fields of one User with one round trip, the updated document is returned by
+# the server. it returns None when the User is not found or is not at the expected version
+async def update_one(collection, user_id: str, changes: dict, version: Optional[int] = None) -> Optional[dict]:
+    from pymongo import ReturnDocument, errors
+
+    query = update_query(user_id, version)
+    collection = as_async(collection)
+    try:
+        with timed("mongo"):
+            document = await collection.find_one_and_update(query, update_document(changes),
+                                                            return_document=ReturnDocument.AFTER)
+    except errors.DuplicateKeyError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=[e.details])
+    finally:
+        await profile_cache.invalidate(profile_key(collection, user_id))
+    return document
+
+
+# update_password_hash replaces the hashed password, only if it was not changed since it has been read
+async def update_password_hash(collection, user_id: str, hashed_password: str, previous_hashed_password: str) -> bool:
+    check_valid_id(user_id)
+    collection = as_async(collection)
+    with timed("mongo"):
+        result = await collection.update_one(
+            {"_id": ObjectId(user_id), "hashed_password": previous_hashed_password},
+            {"$set": {"hashed_password": hashed_password}},
+        )
+    await profile_cache.invalidate(profile_key(collection, user_id))
+    return bool(result.modified_count)
+
+
+# USER_PROJECTION has only the fields of User, so the hashed password is never fetched
+USER_PROJECTION = {field: 1 for field in User.__fields__ if field != 'id'}
+
+
+# page_sort returns the field that orders the pages of find_many. the email prefix alone is served by the email
+# index in email order, the other pages by the _id and (name, _id) indexes in id order
+def page_sort(email_prefix: Optional[str] = None, name: Optional[str] = None) -> str:
+    return "email" if email_prefix and name is None else "_id"
+
+
+# find_many yields a page of Users sorted by the page_sort field, after is the value of that field on the last User
+# of the previous page, so each page reads only its Users from the index
+async def find_many(collection, after: Optional[str] = None, limit: int = 100, email_prefix: Optional[str] = None,
+                    name: Optional[str] = None) -> AsyncIterator[User]:
+    query = {}
+    sort = page_sort(email_prefix, name)
+    if email_prefix:
+        query["email"] = {"$regex": "^" + re.escape(email_prefix)}
+    if name is not None:
+        query["name"] = name
+    if after is not None and sort == "email":
+        query["email"]["$gt"] = after
+    elif after is not None:
+        check_valid_id(after)
+        query["_id"] = {"$gt": ObjectId(after)}
+
+    cursor = as_async(collection).find(query, USER_PROJECTION).sort(sort, 1).limit(limit)
+    async for stored_user in cursor:
+        yield User.from_mongo_trusted(stored_user)
@@ -0,0 +1,190 @@
+import pytest
+from fastapi import HTTPException, status
+from mongomock import MongoClient
+
+from .collection import AsyncCollection, as_async
+from .users import create_one, create_many, delete_one, find_one, find_one_by_email, find_many, page_sort, \
+    update_one, update_password_hash
+from ..mongo.connection import create_indexes
+from ...models.users import UserInDB
+
+collection = MongoClient().db.collection
+create_indexes(collection)
+
+new_user = UserInDB(
+    email="test@example.com",
+    hashed_password="iuhasiuhdhiuasihud",
+    name="test",
+    display_name="test test",
+    photo_url="http test",
+    phone_number="01028969112"
+)
+
+
+# get_mocked_user_id returns the new_user id
+def get_mocked_user_id():
+    stored_user = collection.find_one({"email": new_user.email})
+    return str(stored_user['_id'])
+
+
+def test_as_async():
+    # test should wrap blocking collections only once
+    coll = as_async(collection)
+    assert isinstance(coll, AsyncCollection)
+    assert as_async(coll) is coll
+
+
+@pytest.mark.asyncio
+async def test_cursor_to_list():
+    # test should iterate a wrapped cursor
+    coll = as_async(MongoClient().db.collection)
+    await coll.insert_many([{"n": n} for n in range(5)])
+    docs = await coll.find({}, {"_id": 0}).sort("n").to_list(3)
+    assert docs == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert [doc["n"] async for doc in coll.find()] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_create_user():
+    # test if create user saves the user on DB
+    stored_user = await create_one(collection, new_user)
+    delattr(stored_user, 'id')
+    assert stored_user == new_user
+
+
+@pytest.mark.asyncio
+async def test_error_duplicated_key():
+    # test if create same user two times throw error
+    with pytest.raises(HTTPException) as e:
+        await create_one(collection, new_user)
+    assert e.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_find_one_user():
+    # test should return user from DB
+    stored_user = await find_one(collection, get_mocked_user_id())
+    delattr(stored_user, 'id')
+    assert stored_user == new_user
+
+
+@pytest.mark.asyncio
+async def test_find_one_no_user():
+    # test should return None if the user is not registered
+    stored_user = await find_one(collection, '601698d6d89d467e68903deb')
+    assert stored_user is None
+
+
+@pytest.mark.asyncio
+async def test_find_one_invalid_id():
+    # test should raise error when id is invalid
+    with pytest.raises(HTTPException) as e:
+        await find_one(collection, 'banana')
+    assert e.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_find_one_by_email():
+    # test should return the User
+    stored_user = await find_one_by_email(collection, new_user.email)
+    delattr(stored_user, 'id')
+    assert stored_user == new_user
+
+
+@pytest.mark.asyncio
+async def test_find_one_by_email_wrong_email():
+    # test should return None if the user is not registered
+    stored_user = await find_one_by_email(collection, 'pizza@burguer.com')
+    assert stored_user is None
+
+
+@pytest.mark.asyncio
+async def test_delete_user():
+    # test if delete exists user should return true
+    assert await delete_one(collection, get_mocked_user_id())
+    assert not await delete_one(collection, '601698d6d89d467e68903deb')
+
+
+@pytest.mark.asyncio
+async def test_create_many():
+    # test should create the users and report the duplicated ones
+    users = [
+        new_user.copy(update={'email': 'many1@example.com', 'phone_number': '01000000001'}),
+        new_user.copy(update={'email': 'many1@example.com', 'phone_number': '01000000002'}),
+    ]
+    results = await create_many(collection, users)
+    assert results[0].user.id == collection.find_one({'email': 'many1@example.com'})['_id']
+    assert results[1].error['code'] == 11000
+    assert 'op' not in results[1].error
+
+
+@pytest.mark.asyncio
+async def test_find_many():
+    # test should page the users by id without the hashed password
+    coll = MongoClient().db.collection
+    users = [new_user.copy(update={'email': f'list{n}@example.com', 'name': 'list' if n % 2 else 'other'})
+             for n in range(5)]
+    await create_many(coll, users)
+
+    first_page = [user async for user in find_many(coll, limit=2)]
+    assert [user.email for user in first_page] == ['list0@example.com', 'list1@example.com']
+    assert not hasattr(first_page[0], 'hashed_password')
+
+    second_page = [user async for user in find_many(coll, after=str(first_page[-1].id), limit=2)]
+    assert [user.email for user in second_page] == ['list2@example.com', 'list3@example.com']
+
+    by_name = [user async for user in find_many(coll, name='list')]
+    assert [user.email for user in by_name] == ['list1@example.com', 'list3@example.com']
+
+    by_email = [user async for user in find_many(coll, email_prefix='list4')]
+    assert [user.email for user in by_email] == ['list4@example.com']
+
+    # the pages filtered by email prefix are in email order and their cursor is the email
+    by_email = [user async for user in find_many(coll, email_prefix='list', after='list2@example.com', limit=1)]
+    assert [user.email for user in by_email] == ['list3@example.com']
+    assert page_sort(email_prefix='list') == 'email'
+    assert page_sort(email_prefix='list', name='list') == '_id'
+
+
+@pytest.mark.asyncio
+async def test_find_many_invalid_id():
+    # test should raise error when the cursor is invalid
+    with pytest.raises(HTTPException) as e:
+        [user async for user in find_many(collection, after='banana')]
+    assert e.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_update_password_hash():
+    # test should update the hash only if it was not changed
+    coll = MongoClient().db.collection
+    user = await create_one(coll, new_user.copy())
+    assert await update_password_hash(coll, str(user.id), 'new hash', user.hashed_password)
+    assert not await update_password_hash(coll, str(user.id), 'other hash', user.hashed_password)
+    assert coll.find_one({'_id': user.id})['hashed_password'] == 'new hash'
+
+
+@pytest.mark.asyncio
+async def test_update_one():
+    # test should write only the changed fields and reject the updates of an older version
+    coll = MongoClient().db.collection
+    create_indexes(coll)
+    user = await create_one(coll, new_user.copy())
+    user_id = str(user.id)
+
+    document = await update_one(coll, user_id, {'name': 'banana', 'photo_url': None}, version=0)
+    assert document['name'] == 'banana'
+    assert 'photo_url' not in document
+    assert document['display_name'] == new_user.display_name
+    assert document['version'] == 1
+    assert coll.find_one({'_id': user.id}) == document
+
+    assert await update_one(coll, user_id, {'name': 'pizza'}, version=0) is None
+    assert (await update_one(coll, user_id, {'name': 'pizza'}, version=1))['version'] == 2
+    assert (await update_one(coll, user_id, {'display_name': 'pizza'}))['version'] == 3
+    assert await update_one(coll, '601698d6d89d467e68903deb', {'name': 'pizza'}) is None
+
+    other = await create_one(coll, new_user.copy(update={'email': 'other@example.com', 'phone_number': '1'}))
+    with pytest.raises(HTTPException) as e:
+        await update_one(coll, str(other.id), {'phone_number': new_user.phone_number})
+    assert e.value.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..env import MONGO_DRIVER, READY_PING_INTERVAL_SECONDS, \
+    READY_PING_TIMEOUT_SECONDS, READY_MAX_LOOP_LAG_SECONDS, READY_MAX_POOL_UTILISATION, READY_MAX_POOL_WAITING, \
+    READY_MAX_HASHER_PENDING_RATIO, LOOP_LAG_INTERVAL_SECONDS
+from ..repositories.mongo.connection import mongo_connection
+from ..services.password import password_hasher
+
+router = APIRouter(tags=["health"])
+
+# the probes must not be cached by proxies
+NO_STORE = {"Cache-Control": "no-store"}
+
+
+# LoopLagMonitor measures how late the event loop wakes up a sleeping task, a late wake up means the loop
+# is blocked or has more ready tasks than it can run
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - start - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# ping_mongo pings the server with the client of the configured driver
+async def ping_mongo():
+    if MONGO_DRIVER == "motor":
+        await mongo_connection.async_client.admin.command("ping")
+    else:
+        await run_in_threadpool(mongo_connection.client.admin.command, "ping")
+
+
+# CachedPing pings mongo at most once per interval, the probes of the load balancer and the concurrent
+# probes share the last result, so they do not add load on the DB
+class CachedPing:
+    def __init__(self, ping: Callable[[], Awaitable] = ping_mongo, interval: float = 2, timeout: float = 1,
+                 timer=time.monotonic):
+        self.ping = ping
+        self.interval = interval
+        self.timeout = timeout
+        self.timer = timer
+        self.ok = False
+        self.error: Optional[str] = None
+        self.latency: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+    async def _check(self):
+        start = self.timer()
+        try:
+            await asyncio.wait_for(self.ping(), self.timeout)
+            self.ok, self.error = True, None
+        except asyncio.TimeoutError:
+            self.ok, self.error = False, f"ping timed out after {self.timeout}s"
+        except Exception as e:
+            self.ok, self.error = False, f"{type(e).__name__}: {e}"
+        self.latency = self.timer() - start
+        self.checked_at = self.timer()
+
+    async def check(self) -> dict:
+        if self.checked_at is None or self.timer() - self.checked_at >= self.interval:
+            if self._inflight is None or self._inflight.done():
+                self._inflight = asyncio.ensure_future(self._check())
+            await asyncio.shield(self._inflight)
+        result = {"ok": self.ok, "latency_seconds": self.latency}
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+
+loop_lag_monitor = LoopLagMonitor(interval=LOOP_LAG_INTERVAL_SECONDS)
+mongo_ping = CachedPing(interval=READY_PING_INTERVAL_SECONDS, timeout=READY_PING_TIMEOUT_SECONDS)
+
+
+# readiness_checks returns the state of each dependency and whether it is under its threshold
+async def readiness_checks() -> Dict[str, dict]:
+    checks = {"mongo": await mongo_ping.check()}
+
+    pool = mongo_connection.pool_stats().get("motor" if MONGO_DRIVER == "motor" else "pymongo")
+    if pool is not None:
+        checks["mongo_pool"] = {
+            "ok": pool["utilisation"] < READY_MAX_POOL_UTILISATION and pool["waiting"] <= READY_MAX_POOL_WAITING,
+            "utilisation": pool["utilisation"],
+            "waiting": pool["waiting"],
+        }
+
+    checks["password_hasher"] = {
+        "ok": password_hasher.pending < password_hasher.max_pending * READY_MAX_HASHER_PENDING_RATIO,
+        "pending": password_hasher.pending,
+        "max_pending": password_hasher.max_pending,
+    }
+
+    checks["event_loop"] = {
+        "ok": loop_lag_monitor.lag < READY_MAX_LOOP_LAG_SECONDS,
+        "lag_seconds": loop_lag_monitor.lag,
+        "max_lag_seconds": loop_lag_monitor.max_lag,
+    }
+    return checks
+
+
+# liveness, the process is running and the event loop answers
+@router.get("/healthz", include_in_schema=False)
+async def healthz():
+    return JSONResponse({"status": "ok"}, headers=NO_STORE)
+
+
+# readiness, the instance can take more requests. it is 503 when a dependency is down or a queue is backed up
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    checks = await readiness_checks()
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        {"status": "ok" if ready else "unavailable", "checks": checks},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers=NO_STORE,
+    )
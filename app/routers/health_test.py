@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+from .health import CachedPing, LoopLagMonitor
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_cached_ping():
+    # test should ping once per interval and share the result
+    calls = 0
+
+    async def ping():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+
+    timer = FakeTimer()
+    cached_ping = CachedPing(ping, interval=2, timer=timer)
+    results = await asyncio.gather(*[cached_ping.check() for _ in range(5)])
+    assert all(result["ok"] for result in results)
+    assert calls == 1
+
+    timer.now = 1
+    await cached_ping.check()
+    assert calls == 1
+    timer.now = 2
+    await cached_ping.check()
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_ping_failures():
+    # test should report the errors and the timeouts
+    async def broken():
+        raise ConnectionError("refused")
+
+    result = await CachedPing(broken).check()
+    assert not result["ok"]
+    assert result["error"] == "ConnectionError: refused"
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    result = await CachedPing(slow, timeout=0.01).check()
+    assert not result["ok"]
+    assert "timed out" in result["error"]
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor():
+    # test should measure the time the loop was blocked
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0)
+    time.sleep(0.05)
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+    assert monitor.max_lag >= 0.03
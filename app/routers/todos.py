@@ -0,0 +1,73 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+
+from ..dependencies import get_token_cookie
+from ..env import TODO_LIST_MAX_LIMIT
+from ..metrics import timed
+from ..models.todos import TodoIn, Todo, TodoPage, TodoBatch, TodoBatchResult, todo_json, todo_page_json
+from ..models.token import TokenData
+from ..repositories.motor import todos as todo_repo
+
+# create todos router, the todos are always scoped to the authenticated user
+router = APIRouter(
+    prefix="/todos",
+    tags=["todos"],
+    responses={status.HTTP_401_UNAUTHORIZED: {"detail": "could not validate credentials"},
+               status.HTTP_404_NOT_FOUND: {"detail": "todo not found"}},
+)
+
+
+# TodoResponse is a pre-serialized Todo response, the todo came from the DB so it is not validated again
+class TodoResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, document: dict, **kwargs):
+        with timed("serialize"):
+            content = todo_json(document)
+        super().__init__(content=content, **kwargs)
+
+
+# TodoPageResponse is a pre-serialized TodoPage response
+class TodoPageResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, documents: List[dict], next_cursor: Optional[str], **kwargs):
+        with timed("serialize"):
+            content = todo_page_json(documents, next_cursor)
+        super().__init__(content=content, **kwargs)
+
+
+@router.post("/", response_model=Todo)
+async def create_todo(todo_in: TodoIn, coll=Depends(todo_repo.get_todo_collection),
+                      token_data: TokenData = Depends(get_token_cookie)):
+    document = await todo_repo.create_one(coll, token_data.id, todo_in)
+    return TodoResponse(document)
+
+
+@router.get("/", response_model=TodoPage)
+async def list_todos(after: Optional[str] = None, limit: int = Query(100, ge=1, le=TODO_LIST_MAX_LIMIT),
+                     completed: Optional[bool] = None, coll=Depends(todo_repo.get_todo_collection),
+                     token_data: TokenData = Depends(get_token_cookie)):
+    # after is the next_cursor of the previous page
+    documents, next_cursor = await todo_repo.find_page(coll, token_data.id, after=after, limit=limit,
+                                                       completed=completed)
+    return TodoPageResponse(documents, next_cursor)
+
+
+@router.post("/batch", response_model=TodoBatchResult)
+async def batch_todos(batch: TodoBatch, coll=Depends(todo_repo.get_todo_collection),
+                      token_data: TokenData = Depends(get_token_cookie)):
+    # all the changes are sent to the DB with one bulk write
+    modified, deleted = await todo_repo.apply_batch(coll, token_data.id, complete=batch.complete,
+                                                    reopen=batch.reopen, delete=batch.delete)
+    return TodoBatchResult(modified=modified, deleted=deleted)
+
+
+@router.get("/{todo_id}", response_model=Todo)
+async def get_todo(todo_id: str, coll=Depends(todo_repo.get_todo_collection),
+                   token_data: TokenData = Depends(get_token_cookie)):
+    document = await todo_repo.find_one(coll, token_data.id, todo_id)
+    if document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="todo not found")
+    return TodoResponse(document)
@@ -1,15 +1,28 @@
+import asyncio
+import logging
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Union
-
-from fastapi import APIRouter, HTTPException, status, Depends, Response
-from jose import jwt
-from passlib.context import CryptContext
-
-from ..dependencies import get_token_cookie
-from ..env import COOKIE_ACCESS_KEY, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from typing import AsyncIterable, AsyncIterator, List, Optional, Tuple, Union
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Response, Request
+from pydantic import ValidationError
+
+from ..dependencies import get_token_cookie, decode_token, credentials_exception, require_admin
+from ..env import COOKIE_ACCESS_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, BULK_CHUNK_SIZE, \
+    BULK_MAX_LINE_BYTES, COOKIE_REFRESH_KEY, REFRESH_TOKEN_EXPIRE_DAYS
+from ..etag import document_etag, etag_matches, etag_version
+from ..keys import key_set
+from ..logs import bind_log_context
+from ..metrics import timed
 from ..models.token import TokenData
-from ..models.users import UserIn, UserInDB, User, OID, UserSignIn
-from ..repositories.mongo import users as user_repo
+from ..models.users import UserIn, UserInDB, User, OID, UserSignIn, UserUpdate, user_json
+from ..ratelimit import check_sign_in_rate, record_failed_sign_in
+from ..repositories.motor import users as user_repo, revocations as revocation_repo
+from ..services.password import password_hasher, hash_password, check_password, needs_rehash
+from ..services.revocation import revocation_list
+from ..streaming import NDJSONResponse, LineTooLongError, iter_lines, ndjson_line
+
+logger = logging.getLogger(__name__)
 
 # create users router
 router = APIRouter(
@@ -21,9 +34,6 @@ router = APIRouter(
                status.HTTP_404_NOT_FOUND: {"detail": "user not found"}},
 )
 
-# pwd_context create a crypto context for hash
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 # check_confirm_password checks if the password has been confirmed by the user
 def check_confirm_password(pass1: str, pass2: str):
@@ -34,7 +44,18 @@ def check_confirm_password(pass1: str, pass2: str):
 
 # get_password_hash return the hashed assword
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return hash_password(password)
+
+
+# UserResponse is a pre-serialized User response, the user came from the DB so it is not validated again
+class UserResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, user: Union[User, UserInDB, dict], **kwargs):
+        data = user if isinstance(user, dict) else user.__dict__
+        with timed("serialize"):
+            content = user_json(data)
+        super().__init__(content=content, **kwargs)
 
 
 # create_access_token creates a access token
@@ -45,16 +66,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encode_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # the token id is used to revoke the token
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    with timed("jwt_encode"):
+        encode_jwt = key_set.encode(to_encode)
     return encode_jwt
 
 
+# create_refresh_token creates a refresh token, it can only be used to get new access tokens
+def create_refresh_token(data: dict, expires_delta: timedelta):
+    return create_access_token({**data, "type": "refresh"}, expires_delta)
+
+
 # delete_access_cookie deletes the access cookie
 def delete_access_cookie(response: Response):
     response.delete_cookie(key=COOKIE_ACCESS_KEY)
     return
 
 
+# delete_refresh_cookie deletes the refresh cookie
+def delete_refresh_cookie(response: Response):
+    response.delete_cookie(key=COOKIE_REFRESH_KEY, path=router.prefix)
+    return
+
+
 # create_access_cookie send cookie with the response
 def create_access_cookie(response: Response, value: str, max_age: int):
     response.set_cookie(
@@ -68,10 +103,22 @@ def create_access_cookie(response: Response, value: str, max_age: int):
     return
 
 
-# create_user_on_db creates a user on database
-def create_user_on_db(user_in: UserIn, hashed_password: str, coll=Depends(user_repo.get_user_collection)) -> User:
-    # creates a user for insert on db
-    user_db = UserInDB(
+# create_refresh_cookie send the refresh cookie with the response, it is sent back only to the users routes
+def create_refresh_cookie(response: Response, value: str, max_age: int):
+    response.set_cookie(
+        key=COOKIE_REFRESH_KEY,
+        value=value,  # refresh_token
+        max_age=max_age,
+        path=router.prefix,
+        # secure=True,  # can be sent on https only, must be set for production
+        httponly=True  # javascript cant access the cookie
+    )
+    return
+
+
+# new_user_in_db returns the user for insert on db
+def new_user_in_db(user_in: UserIn, hashed_password: str) -> UserInDB:
+    return UserInDB(
         email=user_in.email,
         hashed_password=hashed_password,
         name=user_in.name,
@@ -80,41 +127,67 @@ def create_user_on_db(user_in: UserIn, hashed_password: str, coll=Depends(user_r
         phone_number=user_in.phone_number
     )
 
-    stored_user = user_repo.create_one(coll, user_db)
+
+# create_user_on_db creates a user on database
+async def create_user_on_db(user_in: UserIn, hashed_password: str, coll=Depends(user_repo.get_user_collection)) -> User:
+    # creates a user for insert on db
+    user_db = new_user_in_db(user_in, hashed_password)
+
+    stored_user = await user_repo.create_one(coll, user_db)
 
     return stored_user
 
 
 # get_user_on_db gets te user on database
-def get_user_on_db(_id: str, coll: user_repo.get_user_collection) -> User:
-    store_user = user_repo.find_one(coll, _id)
+async def get_user_on_db(_id: str, coll: user_repo.get_user_collection) -> User:
+    store_user = await user_repo.find_one(coll, _id)
     if store_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="user not found")
-    return User(**store_user.dict())
+    return User.from_mongo_trusted(store_user.__dict__)
 
 
 # verify_password checks if plain_password matches with the hashed_password
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return check_password(plain_password, hashed_password)
 
 
-# authenticate_user returns the authenticated user
-def authenticate_user(coll: user_repo.get_user_collection, email: str, password: str) -> Union[User, bool]:
-    user = user_repo.find_one_by_email(coll, email)
+# rehash_password updates the hashed password to the current hashing policy, it runs after the response is sent
+async def rehash_password(coll, _id: str, password: str, previous_hashed_password: str):
+    try:
+        hashed_password = await password_hasher.hash(password)
+    except HTTPException:
+        # the hasher is overloaded, the password is re-hashed on the next sign in
+        return
+    await user_repo.update_password_hash(coll, _id, hashed_password, previous_hashed_password)
 
+
+# authenticate_user returns the authenticated user, the password is checked on the hasher pool.
+# if background_tasks is sent and the hash is outdated, the password is re-hashed after the response
+async def authenticate_user(coll: user_repo.get_user_collection, email: str, password: str,
+                            background_tasks: Optional[BackgroundTasks] = None) -> Union[User, bool]:
+    user = await user_repo.find_one_by_email(coll, email)
+
+    # an unknown email costs the same as a wrong password, so the emails can not be found by timing
     if not user:
+        with timed("hash_verify"):
+            await password_hasher.verify_dummy(password)
         return False
 
-    if not verify_password(password, user.hashed_password):
+    with timed("hash_verify"):
+        is_valid = await password_hasher.verify(password, user.hashed_password)
+    if not is_valid:
         return False
 
-    return User(**user.dict())
+    if background_tasks is not None and needs_rehash(user.hashed_password):
+        background_tasks.add_task(rehash_password, coll, str(user.id), password, user.hashed_password)
+
+    return User.from_mongo_trusted(user.__dict__)
 
 
 # get_current_user returns the current user
 async def get_current_user(token_data: TokenData, coll: user_repo.get_user_collection) -> User:
     _id = token_data.id
-    current_user = get_user_on_db(_id, coll=coll)
+    current_user = await get_user_on_db(_id, coll=coll)
     return current_user
 
 
@@ -126,47 +199,225 @@ def add_access_cookie(response: Response, _id: Optional[OID]):
     access_token = create_access_token(access_token_data.dict(), access_token_expires)
 
     # add cookie to header
-    create_access_cookie(response, access_token, access_token_expires.seconds)
+    create_access_cookie(response, access_token, int(access_token_expires.total_seconds()))
+
+
+# add_refresh_cookie adds the refresh cookie to the header
+def add_refresh_cookie(response: Response, _id: Optional[OID]):
+    refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    refresh_token = create_refresh_token(TokenData(id=str(_id)).dict(), refresh_token_expires)
+    create_refresh_cookie(response, refresh_token, int(refresh_token_expires.total_seconds()))
+
+
+# get_refresh_token_claims returns the claims of the refresh token, revoked or access tokens are rejected
+def get_refresh_token_claims(token: Optional[str]) -> dict:
+    if not token:
+        raise credentials_exception
+    claims = decode_token(token)
+    if claims.get('type') != 'refresh' or claims.get('id') is None or revocation_list.is_revoked(claims.get('jti')):
+        raise credentials_exception
+    return claims
+
+
+# revoke_cookie_token revokes the token of the cookie if it is valid, the invalid tokens are ignored
+async def revoke_cookie_token(coll, token: Optional[str]):
+    if not token:
+        return
+    try:
+        claims = decode_token(token)
+    except HTTPException:
+        return
+    if claims.get('jti') is not None and claims.get('exp') is not None:
+        await revocation_list.revoke(coll, claims['jti'], claims['exp'])
+
+
+# create_users_chunk hashes the passwords of the chunk in parallel and inserts the users with one insert
+async def create_users_chunk(chunk: List[Tuple[int, UserIn]], coll) -> List[bytes]:
+    # the bulk import waits for the hasher instead of failing fast, it only uses the background slots of the
+    # hasher so the interactive requests keep their room
+    hashed_passwords = await asyncio.gather(
+        *[password_hasher.hash(user_in.password, fail_fast=False) for _, user_in in chunk])
+    users = [new_user_in_db(user_in, hashed_password) for (_, user_in), hashed_password in zip(chunk, hashed_passwords)]
+
+    results = await user_repo.create_many(coll, users)
+
+    lines = []
+    for (line_number, _), result in zip(chunk, results):
+        if result.error is not None:
+            lines.append(ndjson_line({"line": line_number, "error": result.error}))
+        else:
+            lines.append(ndjson_line({"line": line_number, "id": str(result.user.id)}))
+    return lines
+
+
+# bulk_create_users validates each line of the body and creates the users in chunks,
+# it yields one result line (created id or error) per input line
+async def bulk_create_users(body: AsyncIterable[bytes], coll) -> AsyncIterator[bytes]:
+    chunk = []
+    line_number = 0
+    try:
+        async for line in iter_lines(body, BULK_MAX_LINE_BYTES):
+            line_number += 1
+            if not line.strip():
+                continue
+
+            try:
+                user_in = UserIn.parse_raw(line)
+            except ValidationError as e:
+                yield ndjson_line({"line": line_number, "error": e.errors()})
+                continue
+
+            if not check_confirm_password(user_in.password, user_in.password_confirm):
+                yield ndjson_line({"line": line_number, "error": "passwords not match"})
+                continue
+
+            chunk.append((line_number, user_in))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                for result in await create_users_chunk(chunk, coll):
+                    yield result
+                chunk = []
+    except LineTooLongError as e:
+        yield ndjson_line({"line": line_number + 1, "error": str(e)})
+
+    if chunk:
+        for result in await create_users_chunk(chunk, coll):
+            yield result
 
 
 @router.post("/", response_model=User)
-async def create_user(user_in: UserIn, response: Response, coll=Depends(user_repo.get_user_collection)):
+async def create_user(user_in: UserIn, coll=Depends(user_repo.get_user_collection)):
     # check if the confirm password matches with the password
     if not check_confirm_password(user_in.password, user_in.password_confirm):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="passwords not match")
 
-    # gets the hashed password
-    hashed_password = get_password_hash(user_in.password)
+    # gets the hashed password without blocking the event loop
+    with timed("hash"):
+        hashed_password = await password_hasher.hash(user_in.password)
 
     # creates the user on db
-    created_user = create_user_on_db(user_in, hashed_password, coll)
+    created_user = await create_user_on_db(user_in, hashed_password, coll)
 
-    # creates and add access cookie
-    add_access_cookie(response, created_user.id)
+    # creates and add access cookie, the returned response is sent as it is
+    user_response = UserResponse(created_user)
+    add_access_cookie(user_response, created_user.id)
+    add_refresh_cookie(user_response, created_user.id)
 
-    return created_user
+    return user_response
 
 
 @router.get("/me/", response_model=User)
-async def get_me(coll=Depends(user_repo.get_user_collection), token_data: TokenData = Depends(get_token_cookie)):
-    # return the current user
-    return await get_current_user(token_data, coll)
+async def get_me(request: Request, coll=Depends(user_repo.get_user_collection),
+                 token_data: TokenData = Depends(get_token_cookie)):
+    # return the current user straight from the stored document
+    stored_user = await user_repo.find_one_document(coll, token_data.id)
+    if stored_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="user not found")
+
+    # the clients that polled the same version get a 304 and the user is not serialized
+    headers = {"ETag": document_etag(stored_user), "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return UserResponse(stored_user, headers=headers)
+
+
+# expected_version returns the version of the user that the If-Match header was read from. the version ETags
+# are parsed without reading the user, the other ETags are compared with the current user. the weak ETags match
+# on purpose, see etag_version
+async def expected_version(coll, user_id: str, if_match: str) -> int:
+    version = etag_version(if_match, user_id)
+    if version is not None:
+        return version
+    stored_user = await user_repo.find_one_document(coll, user_id)
+    if stored_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="user not found")
+    if not etag_matches(if_match, document_etag(stored_user)):
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="the user has changed")
+    return stored_user.get("version", 0)
+
+
+@router.patch("/me/", response_model=User)
+async def update_me(user_update: UserUpdate, request: Request, coll=Depends(user_repo.get_user_collection),
+                    token_data: TokenData = Depends(get_token_cookie)):
+    # only the sent fields are written, so concurrent edits of other fields are kept
+    changes = user_update.dict(exclude_unset=True)
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="no fields to update")
+
+    # with If-Match the update is applied only on the version the client has read
+    if_match = request.headers.get("if-match")
+    version = await expected_version(coll, token_data.id, if_match) if if_match else None
+
+    stored_user = await user_repo.update_one(coll, token_data.id, changes, version)
+    if stored_user is None:
+        if version is not None and await user_repo.find_one_document(coll, token_data.id) is not None:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="the user has changed")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="user not found")
+
+    headers = {"ETag": document_etag(stored_user), "Cache-Control": "private, no-cache"}
+    return UserResponse(stored_user, headers=headers)
 
 
 @router.post("/sign-in/", response_model=User)
-async def sign_in(user_sign_in: UserSignIn, response: Response, coll=Depends(user_repo.get_user_collection)):
+async def sign_in(user_sign_in: UserSignIn, request: Request, response: Response, background_tasks: BackgroundTasks,
+                  coll=Depends(user_repo.get_user_collection)):
+    # rejects abusive clients before reaching the hasher and the DB
+    await check_sign_in_rate(request, user_sign_in.email)
+
     # get the information is correct
-    user = authenticate_user(coll, email=user_sign_in.email, password=user_sign_in.password)
+    user = await authenticate_user(coll, email=user_sign_in.email, password=user_sign_in.password,
+                                   background_tasks=background_tasks)
 
     # if the user is not authenticated send the unauthorized and delete the cookie
     if not user:
+        logger.info("sign in failed")
+        await record_failed_sign_in(request, user_sign_in.email)
         delete_access_cookie(response)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
+    bind_log_context(user_id=str(user.id))
+    logger.info("signed in")
+
+    # creates and add access cookie, the returned response is sent as it is
+    user_response = UserResponse(user)
+    add_access_cookie(user_response, user.id)
+    add_refresh_cookie(user_response, user.id)
+
+    return user_response
+
+
+@router.post("/refresh/", status_code=status.HTTP_204_NO_CONTENT)
+async def refresh(request: Request, revoked_coll=Depends(revocation_repo.get_revoked_token_collection)):
+    claims = get_refresh_token_claims(request.cookies.get(COOKIE_REFRESH_KEY))
+    bind_log_context(user_id=claims['id'])
+
+    # the refresh token is used only once, a token already revoked (e.g. stolen and used before) is rejected
+    if not await revocation_list.revoke(revoked_coll, claims['jti'], claims['exp']):
+        logger.warning("refresh token reused", extra={"jti": claims['jti']})
+        raise credentials_exception
+
+    response = Response(status_code=status.HTTP_204_NO_CONTENT)
+    add_access_cookie(response, claims['id'])
+    add_refresh_cookie(response, claims['id'])
+    return response
+
+
+@router.post("/sign-out/", status_code=status.HTTP_204_NO_CONTENT)
+async def sign_out(request: Request, revoked_coll=Depends(revocation_repo.get_revoked_token_collection)):
+    # revokes both tokens, so a copy of the cookies can not be used after the sign out
+    await revoke_cookie_token(revoked_coll, request.cookies.get(COOKIE_ACCESS_KEY))
+    await revoke_cookie_token(revoked_coll, request.cookies.get(COOKIE_REFRESH_KEY))
+
+    response = Response(status_code=status.HTTP_204_NO_CONTENT)
+    delete_access_cookie(response)
+    delete_refresh_cookie(response)
+    return response
 
-    # creates and add access cookie
-    add_access_cookie(response, user.id)
 
-    return user
+@router.post("/bulk", response_class=NDJSONResponse,
+             responses={status.HTTP_403_FORBIDDEN: {"detail": "the admin role is required"}})
+async def create_users_bulk(request: Request, coll=Depends(user_repo.get_user_collection),
+                            token_data: TokenData = Depends(require_admin)):
+    # the body is a NDJSON of UserIn, it is read while the results are streamed
+    return NDJSONResponse(bulk_create_users(request.stream(), coll))
@@ -47,11 +47,12 @@ def test_create_access_token():
     assert fakeid == fakeid_decoded.get('id')
 
 
-def test_create_user_on_db():
+@pytest.mark.asyncio
+async def test_create_user_on_db():
     # test should create on user on db
     mock_user = get_mock_user()
     hashed_password = get_password_hash(mock_user.password)
-    created_user = create_user_on_db(coll=mock_coll, hashed_password=hashed_password, user_in=mock_user)
+    created_user = await create_user_on_db(coll=mock_coll, hashed_password=hashed_password, user_in=mock_user)
     delattr(mock_user, 'password')
     delattr(mock_user, 'password_confirm')
     delattr(created_user, 'hashed_password')
@@ -59,30 +60,33 @@ def test_create_user_on_db():
     assert mock_user.dict() == created_user.dict()
 
 
-def test_get_user_on_db():
+@pytest.mark.asyncio
+async def test_get_user_on_db():
     # test should return user from db
     mock_user = get_mock_user()
     hashed_password = get_password_hash(mock_user.password)
-    created_user = create_user_on_db(coll=mock_coll, hashed_password=hashed_password, user_in=mock_user)
+    created_user = await create_user_on_db(coll=mock_coll, hashed_password=hashed_password, user_in=mock_user)
     delattr(created_user, 'hashed_password')
-    stored_user = get_user_on_db(str(created_user.id), mock_coll)
+    stored_user = await get_user_on_db(str(created_user.id), mock_coll)
     assert stored_user == created_user
 
 
-def test_get_user_on_db_not_found():
+@pytest.mark.asyncio
+async def test_get_user_on_db_not_found():
     # test should return error for user not found
     mocked_id = '507f1f77bcf86cd799439011'
     with pytest.raises(HTTPException) as e:
-        get_user_on_db(mocked_id, mock_coll)
+        await get_user_on_db(mocked_id, mock_coll)
 
     assert e.value.status_code == status.HTTP_404_NOT_FOUND
 
 
-def test_get_user_on_db_wrong_id():
+@pytest.mark.asyncio
+async def test_get_user_on_db_wrong_id():
     # test should raise error for wrong id
     mocked_id = 'banana'
     with pytest.raises(HTTPException) as e:
-        get_user_on_db(mocked_id, mock_coll)
+        await get_user_on_db(mocked_id, mock_coll)
     assert e.value.status_code == status.HTTP_400_BAD_REQUEST
 
 
@@ -91,7 +95,7 @@ async def test_get_current_user():
     # test should return the current user by the token data
     mock_user = get_mock_user()
     hashed_password = get_password_hash(mock_user.password)
-    created_user = create_user_on_db(coll=mock_coll, hashed_password=hashed_password, user_in=mock_user)
+    created_user = await create_user_on_db(coll=mock_coll, hashed_password=hashed_password, user_in=mock_user)
     delattr(created_user, 'hashed_password')
     access_token_data = TokenData(id=str(created_user.id))
     stored_user = await get_current_user(access_token_data, mock_coll)
@@ -113,24 +117,27 @@ def test_verify_wrong_password():
     assert not verify_password(wrong_password, hashed_password)
 
 
-def test_authenticate_user_not_found():
+@pytest.mark.asyncio
+async def test_authenticate_user_not_found():
     # test should return False for not created user
     plain_password = "banana"
     wrong_email = "pizza@burgers.com"
-    assert not authenticate_user(coll=mock_coll, email=wrong_email, password=plain_password)
+    assert not await authenticate_user(coll=mock_coll, email=wrong_email, password=plain_password)
 
 
-def test_authenticate_user_wrong_password():
+@pytest.mark.asyncio
+async def test_authenticate_user_wrong_password():
     # test should return False for wrong password
     mock_user = get_mock_user()
     plain_password = "pizza"
-    assert not authenticate_user(coll=mock_coll, email=mock_user.email, password=plain_password)
+    assert not await authenticate_user(coll=mock_coll, email=mock_user.email, password=plain_password)
 
 
-def test_authenticate_user():
+@pytest.mark.asyncio
+async def test_authenticate_user():
     # test should return True for correct password
     mock_user = get_mock_user()
-    stored_user = authenticate_user(coll=mock_coll, email=mock_user.email, password=mock_user.password)
+    stored_user = await authenticate_user(coll=mock_coll, email=mock_user.email, password=mock_user.password)
     delattr(mock_user, 'password')
     delattr(mock_user, 'password_confirm')
     delattr(stored_user, 'id')
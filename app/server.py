@@ -0,0 +1,167 @@
+"""Production launcher of the API.
+
+It runs the app on gunicorn with one uvicorn worker per core, or on uvicorn alone when gunicorn is not
+installed (e.g. on Windows):
+
+    python -m app.server --workers 4 --bind 0.0.0.0:8000
+
+The options default to the WEB_* variables of app/env.py. On SIGTERM the workers stop accepting connections,
+finish the in-flight requests (up to --graceful-timeout seconds) and run the shutdown handlers of the app,
+which close the mongo clients and the password hasher pool.
+"""
+import argparse
+import logging
+import os
+from typing import Tuple
+
+from .env import WEB_BIND, WEB_WORKERS, WEB_WORKER_CLASS, WEB_PRELOAD, WEB_BACKLOG, WEB_KEEPALIVE_SECONDS, \
+    WEB_GRACEFUL_TIMEOUT_SECONDS, WEB_TIMEOUT_SECONDS, WEB_LIMIT_CONCURRENCY, WEB_TRUSTED_PROXIES
+
+try:
+    from uvicorn.workers import UvicornWorker as _UvicornWorker
+except ImportError:  # gunicorn or uvicorn are not installed
+    _UvicornWorker = None
+
+logger = logging.getLogger(__name__)
+
+APP = "app.main:app"
+UVICORN_WORKER = "app.server.UvicornWorker"
+
+if _UvicornWorker is not None:
+    # UvicornWorker is the uvicorn worker of gunicorn with the options of the launcher. gunicorn imports it by its
+    # path, under python -m app.server that is another copy of this module, so the options that gunicorn does not
+    # know are read from the environment when each worker is created on the master
+    class UvicornWorker(_UvicornWorker):
+        CONFIG_KWARGS = {"loop": "auto", "http": "auto"}
+
+        def __init__(self, *args, **kwargs):
+            self.CONFIG_KWARGS = self.config_kwargs()
+            super().__init__(*args, **kwargs)
+
+        @classmethod
+        def config_kwargs(cls) -> dict:
+            return {**cls.CONFIG_KWARGS, "limit_concurrency": int(os.getenv("WEB_LIMIT_CONCURRENCY", 0)) or None}
+
+
+# reset_after_fork drops the state inherited from the master that is not fork-safe, each worker opens its own
+# mongo clients and password hasher pool on first use
+def reset_after_fork():
+    from .repositories.mongo.connection import mongo_connection
+    from .services.password import password_hasher
+
+    mongo_connection.reset_after_fork()
+    password_hasher.reset_after_fork()
+
+
+# post_fork is the gunicorn hook that runs on each worker after the fork
+def post_fork(server, worker):
+    reset_after_fork()
+    logger.info("worker %s started", worker.pid)
+
+
+# parse_bind splits "host:port" in the host and the port
+def parse_bind(bind: str) -> Tuple[str, int]:
+    host, _, port = bind.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+# gunicorn_options returns the gunicorn settings of the arguments
+def gunicorn_options(args: argparse.Namespace) -> dict:
+    return {
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": UVICORN_WORKER if args.worker_class == "uvicorn" else args.worker_class,
+        "preload_app": args.preload,
+        "backlog": args.backlog,
+        "keepalive": args.keepalive,
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.timeout,
+        # the uvicorn worker reads the trusted proxies from this setting
+        "forwarded_allow_ips": args.trusted_proxies,
+        "post_fork": post_fork,
+    }
+
+
+# uvicorn_options returns the uvicorn settings of the arguments
+def uvicorn_options(args: argparse.Namespace) -> dict:
+    options = {
+        "workers": args.workers,
+        "backlog": args.backlog,
+        "timeout_keep_alive": args.keepalive,
+        "limit_concurrency": args.limit_concurrency or None,
+        "proxy_headers": True,
+        "forwarded_allow_ips": args.trusted_proxies,
+    }
+    if args.bind.startswith("unix:"):
+        options["uds"] = args.bind[len("unix:"):]
+    else:
+        options["host"], options["port"] = parse_bind(args.bind)
+    return options
+
+
+def run_gunicorn(args: argparse.Namespace):
+    from gunicorn.app.base import BaseApplication
+
+    # the uvicorn options that gunicorn does not know are passed to the worker class through the environment
+    os.environ["WEB_LIMIT_CONCURRENCY"] = str(args.limit_concurrency)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options(args).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from .main import app
+            return app
+
+    Application().run()
+
+
+def run_uvicorn(args: argparse.Namespace):
+    import uvicorn
+
+    # uvicorn starts the workers with spawn, so they do not inherit the state of this process
+    uvicorn.run(APP, **uvicorn_options(args))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="runs the API on many workers")
+    parser.add_argument("--bind", default=WEB_BIND, help="host:port or unix:path")
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--worker-class", default=WEB_WORKER_CLASS,
+                        help="'uvicorn' or the import path of a gunicorn worker class")
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=WEB_PRELOAD,
+                        help="imports the app before forking the workers")
+    parser.add_argument("--backlog", type=int, default=WEB_BACKLOG, help="max pending connections")
+    parser.add_argument("--keepalive", type=int, default=WEB_KEEPALIVE_SECONDS,
+                        help="seconds to keep an idle connection open")
+    parser.add_argument("--graceful-timeout", type=int, default=WEB_GRACEFUL_TIMEOUT_SECONDS,
+                        help="seconds to finish the in-flight requests on shutdown")
+    parser.add_argument("--timeout", type=int, default=WEB_TIMEOUT_SECONDS,
+                        help="seconds before a silent worker is restarted")
+    parser.add_argument("--limit-concurrency", type=int, default=WEB_LIMIT_CONCURRENCY,
+                        help="max concurrent connections per worker, 0 is unlimited")
+    parser.add_argument("--trusted-proxies", default=WEB_TRUSTED_PROXIES,
+                        help="comma separated ips of the proxies trusted to send X-Forwarded-For")
+    return parser.parse_args(argv)
+
+
+def gunicorn_available() -> bool:
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return False
+    return _UvicornWorker is not None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if gunicorn_available():
+        run_gunicorn(args)
+    else:
+        logger.warning("gunicorn is not installed, running on uvicorn")
+        run_uvicorn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from gunicorn.util import load_class
+
+from .server import parse_args, parse_bind, gunicorn_options, uvicorn_options, post_fork, UVICORN_WORKER
+
+
+def test_parse_bind():
+    # test should split the host and the port
+    assert parse_bind("127.0.0.1:8000") == ("127.0.0.1", 8000)
+    assert parse_bind(":8000") == ("0.0.0.0", 8000)
+
+
+def test_gunicorn_options(monkeypatch):
+    # test should map the arguments to the gunicorn settings
+    args = parse_args(["--workers", "3", "--no-preload", "--backlog", "64", "--keepalive", "2",
+                       "--graceful-timeout", "10"])
+    options = gunicorn_options(args)
+    assert options["workers"] == 3
+    assert options["worker_class"] == UVICORN_WORKER
+    assert options["preload_app"] is False
+    assert options["backlog"] == 64
+    assert options["keepalive"] == 2
+    assert options["graceful_timeout"] == 10
+    assert options["post_fork"] is post_fork
+    assert options["forwarded_allow_ips"] == "127.0.0.1"
+
+    # gunicorn loads the worker class by its path, the uvicorn options it does not know come from the environment
+    monkeypatch.setenv("WEB_LIMIT_CONCURRENCY", "100")
+    worker_class = load_class(options["worker_class"])
+    assert worker_class.config_kwargs() == {"loop": "auto", "http": "auto", "limit_concurrency": 100}
+
+    args = parse_args(["--worker-class", "uvicorn.workers.UvicornH11Worker"])
+    assert gunicorn_options(args)["worker_class"] == "uvicorn.workers.UvicornH11Worker"
+
+
+def test_uvicorn_options():
+    # test should map the arguments to the uvicorn settings
+    options = uvicorn_options(parse_args(["--bind", "127.0.0.1:9000", "--limit-concurrency", "100"]))
+    assert (options["host"], options["port"]) == ("127.0.0.1", 9000)
+    assert options["limit_concurrency"] == 100
+    assert options["proxy_headers"] is True
+    assert uvicorn_options(parse_args(["--trusted-proxies", "10.0.0.1,10.0.0.2"]))["forwarded_allow_ips"] == \
+        "10.0.0.1,10.0.0.2"
+    assert uvicorn_options(parse_args(["--bind", "unix:/tmp/app.sock"]))["uds"] == "/tmp/app.sock"
+
@@ -0,0 +1,223 @@
+import asyncio
+import secrets
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
+
+from fastapi import HTTPException, status
+
+from ..env import PASSWORD_HASHER_EXECUTOR, PASSWORD_HASHER_MAX_WORKERS, PASSWORD_HASHER_MAX_PENDING, \
+    PASSWORD_HASHER_MAX_BACKGROUND, PASSWORD_SCHEMES, BCRYPT_ROUNDS, ARGON2_TIME_COST, ARGON2_MEMORY_COST, \
+    ARGON2_PARALLELISM
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+# build_crypt_context creates the crypto context of the hashing policy, the first scheme is the default and
+# the hashes of the other schemes or with other costs need update
+def build_crypt_context(schemes: str = "bcrypt", bcrypt_rounds: int = 12, argon2_time_cost: int = 2,
+                        argon2_memory_cost: int = 102400, argon2_parallelism: int = 8) -> "CryptContext":
+    from passlib.context import CryptContext
+
+    schemes = [scheme.strip() for scheme in schemes.split(",") if scheme.strip()]
+    settings = {}
+    if "bcrypt" in schemes:
+        settings.update(bcrypt__default_rounds=bcrypt_rounds, bcrypt__min_rounds=bcrypt_rounds,
+                        bcrypt__max_rounds=bcrypt_rounds)
+    if "argon2" in schemes:
+        settings.update(argon2__time_cost=argon2_time_cost, argon2__memory_cost=argon2_memory_cost,
+                        argon2__parallelism=argon2_parallelism)
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+_pwd_context = None
+
+
+# get_pwd_context returns the crypto context of the configured policy, passlib is imported on first use so
+# importing the app stays fast
+def get_pwd_context() -> "CryptContext":
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = build_crypt_context(
+            schemes=PASSWORD_SCHEMES,
+            bcrypt_rounds=BCRYPT_ROUNDS,
+            argon2_time_cost=ARGON2_TIME_COST,
+            argon2_memory_cost=ARGON2_MEMORY_COST,
+            argon2_parallelism=ARGON2_PARALLELISM,
+        )
+    return _pwd_context
+
+
+overloaded_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="server busy, try again later",
+    headers={"Retry-After": "1"},
+)
+
+
+# hash_password returns the hashed password, it runs inside the worker pool
+def hash_password(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+
+# check_password checks if plain_password matches with the hashed_password, it runs inside the worker pool
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+_dummy_hash = None
+
+
+# build_dummy_hash hashes a random password with the current policy once, it runs on the startup so the first
+# sign in of an unknown email does not pay for the hash
+def build_dummy_hash() -> str:
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_urlsafe(16))
+    return _dummy_hash
+
+
+# verify_dummy_password verifies the password against the dummy hash and returns False, so a sign in of an unknown
+# email costs the same as a wrong password. it runs inside the worker pool
+def verify_dummy_password(password: str, dummy_hash: str) -> bool:
+    get_pwd_context().verify(password, dummy_hash)
+    return False
+
+
+# needs_rehash checks if the hash was created with another scheme or cost than the current policy
+def needs_rehash(hashed_password: str) -> bool:
+    return get_pwd_context().needs_update(hashed_password)
+
+
+# _timed runs fn on the worker and returns the result with the time spent running it
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+# HasherStats keeps the timing metrics of the password hasher
+class HasherStats:
+    def __init__(self):
+        self.calls = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    def record(self, wait_seconds: float, run_seconds: float):
+        self.calls += 1
+        self.wait_seconds += wait_seconds
+        self.run_seconds += run_seconds
+        self.max_run_seconds = max(self.max_run_seconds, run_seconds)
+
+    def dict(self):
+        return {
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "wait_seconds": self.wait_seconds,
+            "run_seconds": self.run_seconds,
+            "max_run_seconds": self.max_run_seconds,
+            "avg_run_seconds": self.run_seconds / self.calls if self.calls else 0.0,
+        }
+
+
+# PasswordHasher runs the password hashing on a bounded worker pool so it does not block the event loop. the
+# calls that do not fail fast (e.g. the bulk import) wait for one of max_background slots before they are
+# pending, so they never take more than max_background of the max_pending room of the interactive calls
+class PasswordHasher:
+    def __init__(self, executor: str = "thread", max_workers: int = 1, max_pending: int = 64,
+                 max_background: int = 8):
+        if executor not in ("thread", "process"):
+            raise ValueError("executor must be 'thread' or 'process'")
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_background = max_background
+        self.pending = 0
+        self.stats = HasherStats()
+        self._executor: Optional[Executor] = None
+        self._background: Optional[asyncio.Semaphore] = None
+
+    # background returns the semaphore of the calls that do not fail fast, it is created on first use
+    @property
+    def background(self) -> asyncio.Semaphore:
+        if self._background is None:
+            self._background = asyncio.Semaphore(self.max_background)
+        return self._background
+
+    # executor creates the pool on first use
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hasher")
+        return self._executor
+
+    # is_overloaded checks if the pool has no room for new calls
+    def is_overloaded(self) -> bool:
+        return self.pending >= self.max_pending
+
+    async def _run(self, fn, *args, fail_fast: bool = True):
+        # rejects the call when the queue is full, so the client can retry on another instance
+        if fail_fast:
+            if self.is_overloaded():
+                self.stats.rejected += 1
+                raise overloaded_exception
+            return await self._submit(fn, *args)
+
+        async with self.background:
+            return await self._submit(fn, *args)
+
+    async def _submit(self, fn, *args):
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_event_loop()
+            result, run_seconds = await loop.run_in_executor(self.executor, _timed, fn, *args)
+        finally:
+            self.pending -= 1
+
+        self.stats.record(time.perf_counter() - start - run_seconds, run_seconds)
+        return result
+
+    # hash returns the hashed password
+    async def hash(self, password: str, fail_fast: bool = True) -> str:
+        return await self._run(hash_password, password, fail_fast=fail_fast)
+
+    # verify checks if plain_password matches with the hashed_password
+    async def verify(self, plain_password: str, hashed_password: str, fail_fast: bool = True) -> bool:
+        return await self._run(check_password, plain_password, hashed_password, fail_fast=fail_fast)
+
+    # verify_dummy spends the same time as verify and returns False
+    async def verify_dummy(self, plain_password: str, fail_fast: bool = True) -> bool:
+        global _dummy_hash
+        if _dummy_hash is None:
+            # without the startup warmup the dummy hash is built on the pool by the first call
+            _dummy_hash = await self.hash(secrets.token_urlsafe(16), fail_fast=fail_fast)
+        # the dummy hash is sent to the worker, so the process workers do not build their own
+        return await self._run(verify_dummy_password, plain_password, _dummy_hash, fail_fast=fail_fast)
+
+    # reset_after_fork forgets the pool inherited from the parent process, its workers do not exist on the child.
+    # the next call creates a new pool
+    def reset_after_fork(self):
+        self._executor = None
+        self._background = None
+        self.pending = 0
+
+    # shutdown stops the worker pool
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    executor=PASSWORD_HASHER_EXECUTOR,
+    max_workers=PASSWORD_HASHER_MAX_WORKERS,
+    max_pending=PASSWORD_HASHER_MAX_PENDING,
+    max_background=PASSWORD_HASHER_MAX_BACKGROUND,
+)
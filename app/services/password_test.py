@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, status
+
+from .password import PasswordHasher, hash_password, check_password, build_crypt_context, needs_rehash, \
+    build_dummy_hash
+
+
+def test_hash_password():
+    # test should hash and check the password
+    hashed_password = hash_password('banana')
+    assert hashed_password != 'banana'
+    assert check_password('banana', hashed_password)
+    assert not check_password('pizza', hashed_password)
+
+
+def test_build_crypt_context():
+    # test should flag the hashes created with other costs
+    context = build_crypt_context(bcrypt_rounds=5)
+    old_hash = build_crypt_context(bcrypt_rounds=4).hash('banana')
+    assert context.verify('banana', old_hash)
+    assert context.needs_update(old_hash)
+    assert not context.needs_update(context.hash('banana'))
+
+
+def test_needs_rehash():
+    # test should not flag the hashes of the current policy
+    assert not needs_rehash(hash_password('banana'))
+    assert needs_rehash(build_crypt_context(bcrypt_rounds=4).hash('banana'))
+
+
+def test_invalid_executor():
+    # test should raise error for unknown executor
+    with pytest.raises(ValueError):
+        PasswordHasher(executor='banana')
+
+
+@pytest.mark.asyncio
+async def test_hasher_hash_and_verify():
+    # test should hash and verify on the worker pool and record the timings
+    hasher = PasswordHasher(max_workers=2)
+    hashed_password = await hasher.hash('banana')
+    assert await hasher.verify('banana', hashed_password)
+    assert not await hasher.verify('pizza', hashed_password)
+    assert hasher.stats.calls == 3
+    assert hasher.stats.run_seconds > 0
+    assert hasher.pending == 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hasher_verify_dummy():
+    # test should verify against the dummy hash built on the startup and return False
+    build_dummy_hash()
+    hasher = PasswordHasher()
+    assert not await hasher.verify_dummy('banana')
+    assert hasher.stats.calls == 1
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hasher_overloaded():
+    # test should fail fast when the queue is full
+    hasher = PasswordHasher(max_workers=1, max_pending=1)
+    first = asyncio.ensure_future(hasher.hash('banana'))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as e:
+        await hasher.hash('pizza')
+    assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert hasher.stats.rejected == 1
+
+    # calls that does not fail fast waits for the pool
+    assert await hasher.hash('pizza', fail_fast=False)
+    assert await first
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hasher_background_slots():
+    # test should keep the calls that do not fail fast under max_background, so the others are not rejected
+    hasher = PasswordHasher(max_workers=1, max_pending=4, max_background=2)
+    background = [asyncio.ensure_future(hasher.hash('banana', fail_fast=False)) for _ in range(6)]
+    await asyncio.sleep(0)
+    assert hasher.pending == 2
+    assert not hasher.is_overloaded()
+    assert await hasher.hash('pizza')
+    assert all(await asyncio.gather(*background))
+    assert hasher.stats.rejected == 0
+    hasher.shutdown()
+
+
+def test_hasher_reset_after_fork():
+    # test should create a new pool after the fork
+    hasher = PasswordHasher(max_workers=1)
+    inherited = hasher.executor
+    hasher.reset_after_fork()
+    assert hasher.executor is not inherited
+    hasher.shutdown()
+    inherited.shutdown()
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+from ..env import REVOCATION_REFRESH_SECONDS, REVOCATION_REFRESH_OVERLAP_SECONDS
+from ..repositories.motor import revocations as revocation_repo
+
+logger = logging.getLogger(__name__)
+
+
+# utc_timestamp returns the timestamp of the date, the dates read from mongo are naive UTC dates
+def utc_timestamp(date: datetime) -> float:
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+# RevocationList keeps the ids of the revoked tokens that did not expire yet on the process memory, so the
+# tokens are checked without a DB round trip. the new revocations are read from the DB in the background
+class RevocationList:
+    def __init__(self, refresh_seconds: float = 5, overlap_seconds: float = 30, timer=time.time):
+        self.refresh_seconds = refresh_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.timer = timer
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_refresh_at: Optional[float] = None
+        # jti -> expiration timestamp of the token
+        self._revoked: Dict[str, float] = {}
+        self._since: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._revoked)
+
+    # is_revoked checks if the token id is revoked, it does not touch the DB
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None:
+            return False
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > self.timer()
+
+    # add marks the token id as revoked until the token expires
+    def add(self, jti: str, expires_at: float):
+        if expires_at > self.timer():
+            self._revoked[jti] = expires_at
+
+    # revoke stores the revocation on the DB, so the other instances read it, and adds it to the list.
+    # it returns False if the token was already revoked
+    async def revoke(self, collection, jti: str, expires_at: float) -> bool:
+        expires_at_date = datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None)
+        revoked = await revocation_repo.revoke(collection, jti, expires_at_date, datetime.utcnow())
+        self.add(jti, expires_at)
+        return revoked
+
+    # prune removes the expired token ids, they are rejected by the token expiration anyway
+    def prune(self):
+        now = self.timer()
+        for jti in [jti for jti, expires_at in self._revoked.items() if expires_at <= now]:
+            del self._revoked[jti]
+
+    # refresh reads the revocations made since the last refresh, the first refresh reads all of them
+    async def refresh(self, collection):
+        since = self._since - self.overlap if self._since is not None else datetime.min
+        documents = await revocation_repo.find_revoked_since(collection, since)
+        for document in documents:
+            self.add(document["_id"], utc_timestamp(document["expires_at"]))
+            if self._since is None or document["revoked_at"] > self._since:
+                self._since = document["revoked_at"]
+        self.prune()
+        self.refreshes += 1
+        self.last_refresh_at = self.timer()
+
+    async def _run(self, get_collection: Callable):
+        while True:
+            try:
+                await self.refresh(get_collection())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # the list keeps the known revocations and tries again on the next refresh
+                self.refresh_errors += 1
+                logger.exception("could not refresh the revoked tokens")
+            await asyncio.sleep(self.refresh_seconds)
+
+    # start refreshes the list in background
+    def start(self, get_collection: Callable = revocation_repo.get_revoked_token_collection):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run(get_collection))
+
+    # stop cancels the background refresh
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+revocation_list = RevocationList(
+    refresh_seconds=REVOCATION_REFRESH_SECONDS,
+    overlap_seconds=REVOCATION_REFRESH_OVERLAP_SECONDS,
+)
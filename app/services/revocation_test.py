@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock import MongoClient
+
+from .revocation import RevocationList, utc_timestamp
+from ..repositories.motor import revocations as revocation_repo
+
+
+class FakeTimer:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_is_revoked_until_expiration():
+    # test should forget the revoked token once it expires
+    timer = FakeTimer()
+    revocations = RevocationList(timer=timer)
+    revocations.add('a', expires_at=1010)
+    revocations.add('b', expires_at=900)
+    assert revocations.is_revoked('a')
+    assert not revocations.is_revoked('b')
+    assert not revocations.is_revoked(None)
+
+    timer.now = 1010
+    assert not revocations.is_revoked('a')
+    revocations.prune()
+    assert len(revocations) == 0
+
+
+def test_utc_timestamp():
+    # test should read the naive dates as UTC
+    assert utc_timestamp(datetime(1970, 1, 1, 0, 1)) == 60
+
+
+@pytest.mark.asyncio
+async def test_revoke_once():
+    # test should report the token already revoked
+    coll = MongoClient().db.revoked_tokens
+    revocations = RevocationList()
+    expires_at = utc_timestamp(datetime.utcnow() + timedelta(minutes=5))
+    assert await revocations.revoke(coll, 'a', expires_at)
+    assert not await revocations.revoke(coll, 'a', expires_at)
+    assert revocations.is_revoked('a')
+    assert coll.count_documents({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_incremental():
+    # test should read the revocations of the other instances since the last refresh
+    coll = MongoClient().db.revoked_tokens
+    expires_at = datetime.utcnow() + timedelta(minutes=5)
+    revoked_at = datetime.utcnow()
+    await revocation_repo.revoke(coll, 'old', expires_at, revoked_at - timedelta(hours=1))
+    await revocation_repo.revoke(coll, 'expired', datetime.utcnow() - timedelta(minutes=1), revoked_at)
+
+    revocations = RevocationList(overlap_seconds=30)
+    await revocations.refresh(coll)
+    assert revocations.is_revoked('old')
+    assert not revocations.is_revoked('expired')
+    assert len(revocations) == 1
+
+    # a revocation written with a late clock is still read thanks to the overlap
+    await revocation_repo.revoke(coll, 'late', expires_at, revoked_at - timedelta(seconds=10))
+    await revocation_repo.revoke(coll, 'new', expires_at, revoked_at + timedelta(seconds=1))
+    await revocations.refresh(coll)
+    assert revocations.is_revoked('late')
+    assert revocations.is_revoked('new')
+    assert revocations.refreshes == 2
+
+
+@pytest.mark.asyncio
+async def test_refresh_errors():
+    # test should keep refreshing in background after an error
+    revocations = RevocationList(refresh_seconds=0)
+
+    def broken_collection():
+        raise RuntimeError('mongo is down')
+
+    revocations.start(broken_collection)
+    for _ in range(3):
+        await asyncio.sleep(0)
+    await revocations.stop()
+    assert revocations.refresh_errors >= 1
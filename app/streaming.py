@@ -0,0 +1,50 @@
+import json
+from typing import AsyncIterable, AsyncIterator
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+# NDJSONResponse streams one json document per line, it does not listen for the client disconnect
+# because the endpoint may still be reading the request body while the response is streamed
+class NDJSONResponse(StreamingResponse):
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+        if self.background is not None:
+            await self.background()
+
+
+# LineTooLongError is raised when a line is bigger than the allowed size
+class LineTooLongError(ValueError):
+    pass
+
+
+# check_line_size raises LineTooLongError when the line is bigger than max_line_bytes
+def check_line_size(line: bytes, max_line_bytes: int):
+    if len(line) > max_line_bytes:
+        raise LineTooLongError(f"line is bigger than {max_line_bytes} bytes")
+
+
+# iter_lines yields the lines of a streamed body without loading the whole body in memory, every line (and the
+# incomplete line kept between chunks) is checked against max_line_bytes
+async def iter_lines(stream: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            check_line_size(line, max_line_bytes)
+            yield line
+        # the incomplete line is checked after the complete lines, so the error is reported on its own line
+        check_line_size(buffer, max_line_bytes)
+    if buffer:
+        yield buffer
+
+
+# ndjson_line returns the json line of the data
+def ndjson_line(data) -> bytes:
+    return json.dumps(data, default=str).encode() + b"\n"
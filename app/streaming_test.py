@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from .streaming import LineTooLongError, iter_lines, ndjson_line
+
+
+# stream yields the chunks as a streamed body
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_iter_lines():
+    # test should yield the lines split across the chunks
+    lines = [line async for line in iter_lines(stream(b'{"a": 1}\n{"b"', b': 2}\n', b'{"c": 3}'), 100)]
+    assert lines == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_too_long():
+    # test should raise error when a line is bigger than the limit
+    with pytest.raises(LineTooLongError):
+        async for _ in iter_lines(stream(b'banana' * 10), 10):
+            pass
+
+    # the complete lines are checked too, not only the rest kept between chunks
+    lines = []
+    with pytest.raises(LineTooLongError):
+        async for line in iter_lines(stream(b'short\n' + b'banana' * 10 + b'\nend'), 10):
+            lines.append(line)
+    assert lines == [b'short']
+
+    # the complete lines of the chunk are yielded before the incomplete line is rejected
+    lines = []
+    with pytest.raises(LineTooLongError):
+        async for line in iter_lines(stream(b'{"a":1}\n{"b":2}\n' + b'x' * 50), 20):
+            lines.append(line)
+    assert lines == [b'{"a":1}', b'{"b":2}']
+
+
+def test_ndjson_line():
+    # test should return one json line
+    line = ndjson_line({'id': 1})
+    assert line.endswith(b'\n')
+    assert json.loads(line) == {'id': 1}
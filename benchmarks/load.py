@@ -0,0 +1,292 @@
+"""Load benchmark of the users API.
+
+It drives create_user, sign_in and get_me concurrently through the ASGI app in the same process, so no network
+or server is needed, and reports the latency percentiles, the requests per second and the event loop lag.
+
+    python -m benchmarks.load --requests 200 --concurrency 20 --output results.json
+    python -m benchmarks.load --baseline results.json
+
+The "memory" backend uses a mongomock collection, the "mongo" backend uses the configured MONGO_URI.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.env import COOKIE_ACCESS_KEY
+
+
+# memory_backend returns a mongomock collection with the users indexes
+def memory_backend():
+    from mongomock import MongoClient
+    from app.repositories.mongo.connection import create_indexes
+
+    collection = MongoClient().db.users
+    create_indexes(collection)
+    return collection
+
+
+# mongo_backend returns the collection of the configured driver, the users of the benchmark are not deleted
+def mongo_backend():
+    from app.repositories.mongo.users import get_user_collection
+
+    return get_user_collection()
+
+
+BACKENDS = {
+    "memory": memory_backend,
+    "mongo": mongo_backend,
+}
+
+
+# ASGIResponse is the response of a request sent to the app
+class ASGIResponse:
+    def __init__(self):
+        self.status = None
+        self.headers = []
+        self.body = b""
+
+    def cookie(self, name: str) -> Optional[str]:
+        for key, value in self.headers:
+            if key.lower() == b"set-cookie":
+                cookie = SimpleCookie(value.decode())
+                if name in cookie:
+                    return cookie[name].value
+        return None
+
+
+# asgi_request sends one http request to the app
+async def asgi_request(app, method: str, path: str, body: bytes = b"", headers: Dict[str, str] = None) -> ASGIResponse:
+    headers = dict(headers or {})
+    if body:
+        headers.setdefault("content-type", "application/json")
+        headers["content-length"] = str(len(body))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    response = ASGIResponse()
+    done = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response.status = message["status"]
+            response.headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response.body += message.get("body", b"")
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    return response
+
+
+# LoopLagMonitor measures how late the event loop wakes up a sleeping task
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+# percentile returns the nearest rank percentile of the sorted values
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float, lag: List[float]) -> dict:
+    latencies = sorted(latencies)
+    lag = sorted(lag)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "loop_lag_p50_ms": round(percentile(lag, 50) * 1000, 3),
+        "loop_lag_p99_ms": round(percentile(lag, 99) * 1000, 3),
+        "loop_lag_max_ms": round(lag[-1] * 1000, 3) if lag else 0.0,
+    }
+
+
+# run_scenario runs the calls with the given concurrency and returns the summary
+async def run_scenario(calls: List[Callable[[], Awaitable[ASGIResponse]]], concurrency: int,
+                       expected_status: int = 200) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def timed(call):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call()
+            latencies.append(time.perf_counter() - start)
+            if response.status != expected_status:
+                errors += 1
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[timed(call) for call in calls])
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    return summarize(latencies, errors, elapsed, monitor.samples)
+
+
+async def run(app, requests: int, concurrency: int) -> Dict[str, dict]:
+    run_id = int(time.time() * 1000)
+    users = [{
+        "email": f"bench{run_id}.{n}@example.com",
+        "name": "bench",
+        "password": "banana",
+        "password_confirm": "banana",
+    } for n in range(requests)]
+    cookies = {}
+
+    def create_user(user):
+        async def call():
+            response = await asgi_request(app, "POST", "/users/", json.dumps(user).encode())
+            cookies[user["email"]] = response.cookie(COOKIE_ACCESS_KEY)
+            return response
+
+        return call
+
+    def sign_in(user):
+        body = json.dumps({"email": user["email"], "password": user["password"]}).encode()
+        return lambda: asgi_request(app, "POST", "/users/sign-in/", body)
+
+    def get_me(user):
+        return lambda: asgi_request(app, "GET", "/users/me/",
+                                    headers={"cookie": f"{COOKIE_ACCESS_KEY}={cookies[user['email']]}"})
+
+    results = {"create_user": await run_scenario([create_user(user) for user in users], concurrency)}
+    results["sign_in"] = await run_scenario([sign_in(user) for user in users], concurrency)
+    results["get_me"] = await run_scenario([get_me(user) for user in users], concurrency)
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# compare returns the relative change of each metric against the baseline results
+def compare(results: dict, baseline: dict) -> Dict[str, dict]:
+    changes = {}
+    for scenario, summary in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if not base:
+            continue
+        changes[scenario] = {metric: f"{(value - base[metric]) / base[metric] * 100:+.1f}%"
+                             for metric, value in summary.items()
+                             if metric in ("rps", "p50_ms", "p95_ms", "p99_ms") and base.get(metric)}
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="users API load benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="memory")
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="overrides the bcrypt cost")
+    parser.add_argument("--rate-limit", action="store_true", help="keeps the sign in rate limit enabled")
+    parser.add_argument("--output", help="writes the json results to this file")
+    parser.add_argument("--baseline", help="compares the results with a previous json results file")
+    args = parser.parse_args(argv)
+
+    from app.main import app
+    from app.ratelimit import sign_in_ip_limiter, sign_in_email_limiter
+    from app.repositories.mongo import users as user_repo
+    from app.services.password import password_hasher, get_pwd_context
+
+    if args.bcrypt_rounds is not None:
+        rounds = args.bcrypt_rounds
+        get_pwd_context().update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+    # all the requests come from the same client, so the sign in rate limit is disabled by default
+    sign_in_ip_limiter.enabled = sign_in_email_limiter.enabled = args.rate_limit
+    collection = BACKENDS[args.backend]()
+    app.dependency_overrides[user_repo.get_user_collection] = lambda: collection
+
+    try:
+        scenarios = asyncio.run(run(app, args.requests, args.concurrency))
+    finally:
+        password_hasher.shutdown()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "rate_limit": args.rate_limit,
+        },
+        "scenarios": scenarios,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["baseline"] = compare(results, json.load(f))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Micro-benchmark of the user serialization of get_me and sign_in.
+
+It compares the validated path (from_mongo, User(**user.dict()) and the response_model validation of FastAPI)
+with the trusted path (from_mongo_trusted and the pre-serialized UserResponse).
+
+    python -m benchmarks.serialization
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models.users import User, UserInDB, user_json
+from app.routers.users import UserResponse
+
+document = {
+    "_id": ObjectId(),
+    "email": "test@example.com",
+    "hashed_password": "$2b$12$iuhasiuhdhiuasihudiuhasiuhdhiuasihudiuhasiuhdhiua",
+    "name": "test",
+    "display_name": "test test",
+    "photo_url": "http test",
+    "phone_number": "01028969112",
+}
+
+response_field = create_response_field(name="Response_get_me", type_=User)
+
+
+# validated_response is the response path of FastAPI for a returned model
+async def validated_response(user) -> bytes:
+    content = await serialize_response(field=response_field, response_content=user)
+    return json.dumps(jsonable_encoder(content)).encode()
+
+
+async def get_me_validated() -> bytes:
+    user_in_db = UserInDB.from_mongo(dict(document))
+    user = User(**user_in_db.dict())
+    return await validated_response(user)
+
+
+async def get_me_trusted() -> bytes:
+    return UserResponse(document).body
+
+
+async def sign_in_validated() -> bytes:
+    user_in_db = UserInDB.from_mongo(dict(document))
+    user = User(**user_in_db.dict())
+    return await validated_response(user)
+
+
+async def sign_in_trusted() -> bytes:
+    user_in_db = UserInDB.from_mongo_trusted(document)
+    user = User.from_mongo_trusted(user_in_db.__dict__)
+    return UserResponse(user).body
+
+
+# measure returns the best microseconds per call of the coroutine function
+async def measure(fn, number: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+async def run(number: int) -> dict:
+    assert json.loads(await get_me_validated()) == json.loads(await get_me_trusted()) == json.loads(user_json(document))
+
+    results = {}
+    for name, validated, trusted in (("get_me", get_me_validated, get_me_trusted),
+                                     ("sign_in", sign_in_validated, sign_in_trusted)):
+        validated_us = await measure(validated, number)
+        trusted_us = await measure(trusted, number)
+        results[name] = {"validated_us": round(validated_us, 2), "trusted_us": round(trusted_us, 2),
+                         "saved_us": round(validated_us - trusted_us, 2)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="user serialization micro-benchmark")
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.number))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()